@@ -1,8 +1,60 @@
+import abc
+import asyncio
 import logging
-from typing import Any, Dict, List, Optional, Protocol, Union, overload
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Protocol, Sequence, Set, Tuple, Union, overload
 
 Value = Union[str, bytes, int, float]
 
+BLOCKING_COMMANDS = frozenset(
+    {
+        "BLPOP",
+        "BRPOP",
+        "BRPOPLPUSH",
+        "BLMOVE",
+        "BLMPOP",
+        "BZPOPMIN",
+        "BZPOPMAX",
+        "BZMPOP",
+        "XREAD",
+        "XREADGROUP",
+        "WAIT",
+    }
+)
+
+INVALIDATE_CHANNEL = "__redis__:invalidate"
+
+
+def tracking_args(client_id: Any, prefixes: Sequence[str]) -> List[Any]:
+    args: List[Any] = ["CLIENT", "TRACKING", "ON", "REDIRECT", client_id, "BCAST"]
+    for prefix in prefixes:
+        args.extend(("PREFIX", prefix))
+    return args
+
+
+def xadd_args(
+    stream: str,
+    items: Dict[str, Value],
+    *,
+    id: str = "*",
+    mkstream: bool = True,
+    maxlen: Optional[int] = None,
+    minid: Optional[Value] = None,
+    approx: bool = True,
+    limit: Optional[int] = None,
+) -> List[Any]:
+    args: List[Any] = ["XADD", stream]
+    if not mkstream:
+        args.append("NOMKSTREAM")
+    for name, threshold in (("MAXLEN", maxlen), ("MINID", minid)):
+        if threshold is not None:
+            args.extend((name, "~" if approx else "=", threshold))
+            if approx and limit:
+                args.extend(("LIMIT", limit))
+    args.append(id)
+    for field, value in items.items():
+        args.extend((field, value))
+    return args
+
 
 class Adapter(Protocol):
     async def execute(self, *args: Value) -> Any: ...
@@ -78,3 +130,211 @@ class AdapterHolder(Protocol):
         **kwargs,
     ) -> Adapter: ...
     async def __aexit__(self, exc_type, exc_val, exc_tb): ...
+
+
+class ReplyError(Exception):
+    pass
+
+
+def _chain(fut: asyncio.Future, parse: Callable[[Any], Any]) -> asyncio.Future:
+    result = fut.get_loop().create_future()
+
+    def done(f: asyncio.Future):
+        if f.cancelled():
+            result.cancel()
+        elif (e := f.exception()) is not None:
+            result.set_exception(e)
+        else:
+            result.set_result(parse(f.result()))
+
+    fut.add_done_callback(done)
+    return result
+
+
+def _pairs(reply: Any) -> Dict[Any, Any]:
+    if isinstance(reply, dict):
+        return reply
+    return dict(zip(reply[::2], reply[1::2]))
+
+
+def _ok(reply: Any) -> bool:
+    return reply == b"OK"
+
+
+def _status(reply: Any) -> Any:
+    """
+    >>> [_status(r) for r in (True, "PONG", b"v", 1)]
+    [b'OK', b'PONG', b'v', 1]
+    """
+    # redis-rs returns OK as True and other status replies as str
+    if reply is True:
+        return b"OK"
+    elif isinstance(reply, str):
+        return reply.encode()
+    return reply
+
+
+class Commands(abc.ABC):
+    @abc.abstractmethod
+    def execute(self, *args: Value) -> Awaitable[Any]: ...
+
+    def get(self, key: str):
+        return self.execute("GET", key)
+
+    def set(self, key: str, value: Any, *, ex: Optional[float] = None):
+        if ex:
+            return self.execute("SET", key, value, "PX", int(ex * 1000))
+        return self.execute("SET", key, value)
+
+    def delete(self, key: str):
+        return self.execute("DEL", key)
+
+    def expire(self, key: str, seconds: int):
+        return self.execute("EXPIRE", key, seconds)
+
+    def hget(self, key: str, field: str):
+        return self.execute("HGET", key, field)
+
+    def hmget(self, key: str, *fields: str):
+        return self.execute("HMGET", key, *fields)
+
+    def rpush(self, key: str, value: Any):
+        return self.execute("RPUSH", key, value)
+
+    def lpop(self, key: str):
+        return self.execute("LPOP", key)
+
+    def llen(self, key: str):
+        return self.execute("LLEN", key)
+
+    def lrem(self, key: str, count: int, element: Value):
+        return self.execute("LREM", key, count, element)
+
+    def lrange(self, key: str, start: int, stop: int):
+        return self.execute("LRANGE", key, start, stop)
+
+    def pfadd(self, key: str, *values):
+        return self.execute("PFADD", key, *values)
+
+    def pfcount(self, key: str):
+        return self.execute("PFCOUNT", key)
+
+    def zadd(self, key: str, mapping: Dict[Any, float]):
+        args: List[Any] = []
+        for member, score in mapping.items():
+            args.extend((score, member))
+        return self.execute("ZADD", key, *args)
+
+    def zrem(self, key: str, value: Any):
+        return self.execute("ZREM", key, value)
+
+    def zcard(self, key: str):
+        return self.execute("ZCARD", key)
+
+    def zrange(self, key: str, start: int, stop: int):
+        return self.execute("ZRANGE", key, start, stop)
+
+    def eval(self, script: str, numkeys: int, *args):
+        return self.execute("EVAL", script, numkeys, *args)
+
+    def keys(self, pattern: str):
+        return self.execute("KEYS", pattern)
+
+    def hset(self, key: str, field: Optional[str] = None, value: Any = None, *, mapping: Optional[Dict] = None):
+        args: List[Any] = []
+        if field is not None:
+            args.extend((field, value))
+        for f, v in (mapping or {}).items():
+            args.extend((f, v))
+        return self.execute("HSET", key, *args)
+
+    def hdel(self, key: str, field: str):
+        return self.execute("HDEL", key, field)
+
+    def hgetall(self, key: str):
+        fut = self.execute("HGETALL", key)
+        if isinstance(fut, asyncio.Future):
+            return _chain(fut, _pairs)
+        return fut
+
+    def pfmerge(self, key: str, *keys: str):
+        return self.execute("PFMERGE", key, *keys)
+
+    def xadd(self, stream: str, items: Dict[str, Value], **kwargs):
+        return self.execute(*xadd_args(stream, items, **kwargs))
+
+
+class AutoPipeline(Commands):
+    def __init__(self, adapter: Adapter, window: float = 0):
+        self._adapter = adapter
+        self._window = window
+        self._queue: List[Tuple[Tuple[Value, ...], asyncio.Future]] = []
+        self._scheduled = False
+        self._tasks: Set[asyncio.Task] = set()
+
+    def __getattr__(self, name):
+        return getattr(self._adapter, name)
+
+    # replies are converted as the clients do, so that autopipeline does not change them
+    def set(self, key: str, value: Any, *, ex: Optional[float] = None):
+        return _chain(super().set(key, value, ex=ex), _ok)
+
+    def expire(self, key: str, seconds: int):
+        return _chain(super().expire(key, seconds), bool)
+
+    def pfmerge(self, key: str, *keys: str):
+        return _chain(super().pfmerge(key, *keys), _ok)
+
+    def xadd(self, stream: str, items: Dict[str, Value], **kwargs):
+        return _chain(super().xadd(stream, items, **kwargs), bytes.decode)
+
+    def hset(self, *args, **kwargs):
+        # clients disagree on its reply, so it is not batched
+        return self._adapter.hset(*args, **kwargs)
+
+    def execute(self, *args: Value) -> Awaitable[Any]:
+        if str(args[0]).upper() in BLOCKING_COMMANDS:
+            return self._adapter.execute(*args)
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._queue.append((args, fut))
+        if not self._scheduled:
+            self._scheduled = True
+            if self._window:
+                loop.call_later(self._window, self._flush)
+            else:
+                loop.call_soon(self._flush)
+        return fut
+
+    def _flush(self):
+        queue, self._queue = self._queue, []
+        self._scheduled = False
+        task = asyncio.ensure_future(self._send(queue))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, queue: List[Tuple[Tuple[Value, ...], asyncio.Future]]):
+        commands = [args for args, _ in queue]
+        results: List[Any]
+        try:
+            if len(commands) == 1:
+                results = [await self._adapter.execute(*commands[0])]
+            else:
+                results = await self._adapter.execute_many(commands)  # type: ignore
+        except Exception as e:
+            results = [e] * len(queue)
+        for (_, fut), result in zip(queue, results):
+            if fut.done():
+                continue
+            elif isinstance(result, BaseException):
+                fut.set_exception(result)
+            else:
+                fut.set_result(result)
+
+    async def drain(self):
+        while self._queue or self._tasks:
+            if self._queue and not self._scheduled:
+                self._flush()
+            await asyncio.sleep(0)
+            if self._tasks:
+                await asyncio.wait(list(self._tasks))
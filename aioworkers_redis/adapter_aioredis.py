@@ -1,10 +1,10 @@
 import logging
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Union
 from uuid import uuid4
 
-from aioredis import Redis, create_redis_pool
+from aioredis import Redis, create_connection, create_redis_pool
 
-from aioworkers_redis.adapter import Adapter
+from aioworkers_redis.adapter import BLOCKING_COMMANDS, INVALIDATE_CHANNEL, Adapter, Value, tracking_args, xadd_args
 
 logger = logging.getLogger(__name__)
 
@@ -24,10 +24,13 @@ class AdapterAioRedis:
         address: Union[str, List[str], List[List[str]]] = "redis://localhost:6379",
         db: Optional[int] = None,
         max_size: Optional[int] = None,
+        cluster: Optional[bool] = None,
         logger: Optional[logging.Logger] = None,
         **kwargs,
     ) -> Adapter:
         self.logger = logger or self.logger
+        if cluster:
+            self.logger.warning("aioredis does not support cluster, connect to the first node only")
 
         kwargs.clear()
         if db is not None:
@@ -45,6 +48,7 @@ class AdapterAioRedis:
                 else:
                     nodes.append(n)
 
+        self._address = nodes[0]
         self.client = await create_redis_pool(nodes[0], **kwargs)
         return self
 
@@ -55,6 +59,20 @@ class AdapterAioRedis:
     def __getattr__(self, name):
         return getattr(self.client, name)
 
+    async def execute(self, *args) -> Any:
+        if str(args[0]).upper() in BLOCKING_COMMANDS:
+            with await self.client as conn:
+                return await conn.execute(*args)
+        return await self.client.execute(*args)
+
+    async def execute_many(self, commands: Sequence[Sequence[Any]], transaction: bool = False) -> List[Any]:
+        pipe = self.client.multi_exec() if transaction else self.client.pipeline()
+        # Pipeline.execute sends the batch, the commands one queues a raw command
+        queue = pipe.__getattr__("execute")
+        for args in commands:
+            queue(*args)
+        return await pipe.execute(return_exceptions=True)
+
     def eval(self, script: str, n: int, *args) -> Any:
         keys = args[:n]
         args = args[n:]
@@ -79,17 +97,31 @@ class AdapterAioRedis:
         else:
             return self.client.set(key, value)
 
+    async def tracking(self, *prefixes: str) -> AsyncIterator[Optional[List[bytes]]]:
+        conn = await create_connection(self._address)
+        try:
+            client_id = await conn.execute("CLIENT", "ID")
+            await conn.execute(*tracking_args(client_id, prefixes))
+            await conn.execute_pubsub("SUBSCRIBE", INVALIDATE_CHANNEL)
+            channel = conn.pubsub_channels[INVALIDATE_CHANNEL]
+            yield None
+            while await channel.wait_message():
+                yield await channel.get()
+        finally:
+            conn.close()
+            await conn.wait_closed()
+
     async def blpop(self, *keys: str, timeout: float = 0) -> Dict:
-        result = await self.client.blpop(*keys, timeout=int(timeout))
+        with await self.client as conn:
+            result = await conn.blpop(*keys, timeout=int(timeout))
         if result:
             k, v = result
             return {k.decode("UTF-8"): v}
         return {}
 
-    async def xadd(self, *args, **kwargs):
-        result = await self.client.xadd(*args, **kwargs)
-        if result:
-            return result.decode("UTF-8")
+    async def xadd(self, stream: str, items: Dict[str, Value], **kwargs) -> str:
+        result = await self.execute(*xadd_args(stream, items, **kwargs))
+        return result.decode("UTF-8")
 
     async def xread(
         self,
@@ -100,23 +132,24 @@ class AdapterAioRedis:
         noack: Optional[bool] = None,
         group: Optional[str] = None,
     ) -> Dict:
-        if group:
-            data = await self.client.xread_group(
-                streams=list(streams),
-                group_name=group,
-                consumer_name=self.client_id,
-                no_ack=noack or False,
-                latest_ids=[">"] * len(streams),
-                timeout=block or 0,
-                count=count,
-            )
-        else:
-            data = await self.client.xread(
-                list(streams),
-                timeout=block,
-                latest_ids=[id] * len(streams),
-                count=count,
-            )
+        with await self.client as conn:
+            if group:
+                data = await conn.xread_group(
+                    streams=list(streams),
+                    group_name=group,
+                    consumer_name=self.client_id,
+                    no_ack=noack or False,
+                    latest_ids=[">"] * len(streams),
+                    timeout=block or 0,
+                    count=count,
+                )
+            else:
+                data = await conn.xread(
+                    list(streams),
+                    timeout=block,
+                    latest_ids=[id] * len(streams),
+                    count=count,
+                )
         result: dict = {}
         for streamb, *msgs in data:
             stream = result.setdefault(streamb.decode("UTF-8"), {})
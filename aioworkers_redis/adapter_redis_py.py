@@ -1,16 +1,19 @@
 import logging
-from typing import Dict, List, Optional, Union
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Union
+from urllib.parse import urlparse
 from uuid import uuid4
 
+import redis
 from redis.asyncio import Redis
+from redis.asyncio.cluster import ClusterNode, RedisCluster
 
-from aioworkers_redis.adapter import Adapter
+from aioworkers_redis.adapter import INVALIDATE_CHANNEL, Adapter, Value, tracking_args, xadd_args
 
 logger = logging.getLogger(__name__)
 
 
 class AdapterRedisPy:
-    client: Redis
+    client: Union[Redis, RedisCluster]
 
     def __init__(
         self,
@@ -24,16 +27,19 @@ class AdapterRedisPy:
         address: Union[str, List[str], List[List[str]]] = "redis://localhost:6379",
         db: Optional[int] = None,
         max_size: Optional[int] = None,
+        cluster: Optional[bool] = None,
         logger: Optional[logging.Logger] = None,
         **kwargs,
     ) -> Adapter:
         self.logger = logger or self.logger
 
         kwargs.clear()
-        if db is not None:
+        if db is not None and not cluster:
             kwargs["db"] = db
         if max_size is not None:
             kwargs["max_connections"] = max_size
+        if redis.VERSION >= (5,):
+            kwargs["protocol"] = 2
 
         self._nodes: List[str] = []
         if isinstance(address, str):
@@ -45,17 +51,66 @@ class AdapterRedisPy:
                 else:
                     self._nodes.append(n)
 
-        self.client = Redis.from_url(self._nodes[0], **kwargs)
+        self._cluster = bool(cluster)
+        self._raw: Union[Redis, RedisCluster]
+        if self._cluster:
+            startup_nodes = []
+            for node in self._nodes:
+                url = urlparse(node)
+                startup_nodes.append(ClusterNode(url.hostname or "localhost", url.port or 6379))
+            self.client = RedisCluster(startup_nodes=startup_nodes, **kwargs)
+            # cluster nodes own the response callbacks, so raw replies need a client of their own
+            self._raw = RedisCluster(startup_nodes=startup_nodes, **kwargs)
+            callbacks = self._raw.response_callbacks
+            for command in list(callbacks):
+                # the cluster client parses these replies itself to discover nodes
+                if not command.startswith(("CLUSTER", "COMMAND")):
+                    del callbacks[command]
+            # lazy initialization races when the first commands are concurrent
+            await self.client.initialize()
+            await self._raw.initialize()
+        else:
+            self.client = Redis.from_url(self._nodes[0], **kwargs)
+            # execute returns raw replies like the other adapters do
+            self._raw = Redis(connection_pool=self.client.connection_pool)
+            self._raw.response_callbacks.clear()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if self._cluster:
+            await self._raw.aclose()
         await self.client.aclose()  # type: ignore
 
     def __getattr__(self, name):
         return getattr(self.client, name)
 
     async def execute(self, *args):
-        return await self.client.execute_command(*args)
+        return await self._raw.execute_command(*args)
+
+    async def execute_many(self, commands: Sequence[Sequence[Any]], transaction: bool = False) -> List[Any]:
+        pipe = self._raw.pipeline(transaction=transaction)
+        for args in commands:
+            pipe.execute_command(*args)
+        return await pipe.execute(raise_on_error=False)
+
+    async def tracking(self, *prefixes: str) -> AsyncIterator[Optional[List[bytes]]]:
+        assert isinstance(self.client, Redis), "Tracking is not supported by cluster"
+        conn = self.client.connection_pool.make_connection()
+        try:
+            await conn.connect()
+            await conn.send_command("CLIENT", "ID")
+            client_id = await conn.read_response()
+            await conn.send_command(*tracking_args(client_id, prefixes))
+            await conn.read_response()
+            await conn.send_command("SUBSCRIBE", INVALIDATE_CHANNEL)
+            await conn.read_response()
+            yield None
+            while True:
+                kind, _, keys = await conn.read_response()
+                if kind == b"message":
+                    yield keys
+        finally:
+            await conn.disconnect()
 
     async def blpop(self, *keys: str, timeout: float = 0) -> Dict:
         fut = self.client.blpop(list(keys), timeout=int(timeout))
@@ -64,10 +119,9 @@ class AdapterRedisPy:
             return {k.decode("UTF-8"): v}
         return {}
 
-    async def xadd(self, *args, **kwargs):
-        result = await self.client.xadd(*args, **kwargs)
-        if result:
-            return result.decode("UTF-8")
+    async def xadd(self, stream: str, items: Dict[str, Value], **kwargs) -> str:
+        result = await self.execute(*xadd_args(stream, items, **kwargs))
+        return result.decode("UTF-8")
 
     async def xread(
         self,
@@ -1,13 +1,20 @@
 import asyncio
-from typing import Any, Optional, Type, Union
+import contextlib
+import hashlib
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Type, Union, cast
 
 from aioworkers.core.base import AbstractConnector, AbstractNestedEntity, LoggingEntity
 from aioworkers.core.config import ValueExtractor
 from aioworkers.core.formatter import FormattedEntity
 from aioworkers.core.plugin import iter_entry_points
 from aioworkers.queue.base import AbstractQueue
+from aioworkers.utils import import_name
 
-from aioworkers_redis.adapter import Adapter, AdapterHolder
+from aioworkers_redis.adapter import Adapter, AdapterHolder, AutoPipeline, Commands, ReplyError, Value, _status
+from aioworkers_redis.cache import LocalCache
+from aioworkers_redis.cluster import group_by_slot, primaries
+from aioworkers_redis.metrics import Instrumented, Metrics
 
 DEFAULT_HOST = "localhost"
 DEFAULT_PORT = 6379
@@ -15,6 +22,98 @@ DEFAULT_PORT = 6379
 Client = Any
 
 
+def _is_noscript(e: Exception) -> bool:
+    return type(e).__name__ == "NoScriptError" or str(e).startswith("NOSCRIPT")
+
+
+class Pipeline(Commands):
+    script = """
+        local result = {}
+        local i = 1
+        while i <= #ARGV do
+            local n = tonumber(ARGV[i])
+            local reply = redis.pcall(unpack(ARGV, i + 1, i + n))
+            if type(reply) == 'table' and reply.err then
+                result[#result + 1] = {0, reply.err}
+            else
+                result[#result + 1] = {1, reply}
+            end
+            i = i + n + 1
+        end
+        return result
+        """
+
+    def __init__(self, connector: "Connector", transaction: bool = False):
+        self._connector = connector
+        self._transaction = transaction
+        self._queue: List[Tuple[Tuple[Value, ...], asyncio.Future]] = []
+
+    def raw_key(self, key: str) -> str:
+        return self._connector.raw_key(key)
+
+    def encode(self, value):
+        return self._connector.encode(value)
+
+    def decode(self, value):
+        return self._connector.decode(value)
+
+    def execute(self, *args: Value) -> asyncio.Future:
+        fut = asyncio.get_running_loop().create_future()
+        self._queue.append((args, fut))
+        return fut
+
+    async def send(self) -> List[Any]:
+        queue, self._queue = self._queue, []
+        if not queue:
+            return []
+        commands = [args for args, _ in queue]
+        adapter = self._connector.adapter
+        results: List[Any]
+        connector = self._connector._connector or self._connector._get_connector()
+        if execute_many := getattr(adapter, "execute_many", None):
+            results = await execute_many(commands, transaction=self._transaction)
+        elif not connector._cluster:
+            # one round trip for both modes, a script is atomic anyway
+            args: List[Any] = []
+            for command in commands:
+                args.append(len(command))
+                args.extend(command)
+            results = []
+            for ok, reply in await self._connector.eval_script(self.script, 0, *args):
+                results.append(_status(reply) if ok else ReplyError(reply))
+        elif self._transaction:
+            # the script does not declare its keys, so it cannot be routed to a slot
+            raise ValueError("Transaction needs a client with pipelines in cluster mode")
+        else:
+            results = await asyncio.gather(
+                *(adapter.execute(*args) for args in commands),
+                return_exceptions=True,
+            )
+            results = [_status(r) for r in results]
+        error = None
+        for (_, fut), result in zip(queue, results):
+            if isinstance(result, BaseException):
+                fut.set_exception(result)
+                fut.exception()
+                error = error or result
+            else:
+                fut.set_result(result)
+        if error is not None:
+            raise error
+        return results
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            await self.send()
+        else:
+            for _, fut in self._queue:
+                fut.cancel()
+            self._queue.clear()
+
+
 class Connector(
     AbstractNestedEntity,
     AbstractConnector,
@@ -25,9 +124,26 @@ class Connector(
         self._joiner: str = kwargs.get("joiner", ":")
         self._prefix: str = kwargs.get("prefix", "")
         self._brackets: bool = kwargs.get("brackets", False)
+        self._read_from: str = kwargs.get("read_from", "primary")
         self._connector: Optional[Connector] = None
         self._adapter_holder: Optional[AdapterHolder] = None
         self._adapter: Optional[Adapter] = None
+        self._max_size: Optional[int] = None
+        self._cluster: bool = False
+        self._nodes: List[Adapter] = []
+        self._node_holders: List[AdapterHolder] = []
+        self._replicas: List[Adapter] = []
+        self._replica_holders: List[AdapterHolder] = []
+        self._replica_latency: List[float] = []
+        self._read_selection: str = "round_robin"
+        self._read_index: int = 0
+        self._probing: Optional[asyncio.Task] = None
+        self._scripts: Dict[str, str] = {}
+        self._cache: Optional[LocalCache] = None
+        self._tracking: Optional[asyncio.Task] = None
+        self._metrics: Optional[Metrics] = None
+        self._exporting: Optional[asyncio.Task] = None
+        self._views: Dict[int, Instrumented] = {}
         self._is_ready: asyncio.Event = asyncio.Event()
         kwargs.setdefault("logger", "aioworkers_redis")
         super().__init__(*args, **kwargs)
@@ -36,6 +152,9 @@ class Connector(
         self._joiner = config.get("joiner", self._joiner)
         self._prefix = config.get("prefix", self._prefix)
         self._brackets = config.get("brackets", self._brackets)
+        self._read_from = config.get("read_from", self._read_from)
+        if self._read_from not in ("primary", "replica"):
+            raise ValueError("read_from must be primary or replica, not %r" % self._read_from)
         c = config.get("connection")
         if not isinstance(c, str):
             if config.get("dsn"):
@@ -57,7 +176,50 @@ class Connector(
     def adapter(self) -> Adapter:
         connector = self._connector or self._get_connector()
         assert connector._adapter is not None, "Adapter is not ready"
-        return connector._adapter
+        return self._view(connector._adapter)
+
+    @property
+    def nodes(self) -> List[Adapter]:
+        connector = self._connector or self._get_connector()
+        return [self._view(node) for node in connector._nodes]
+
+    def _view(self, adapter: Adapter) -> Adapter:
+        connector = self._connector or self._get_connector()
+        if connector._metrics is None:
+            return adapter
+        return self._instrument(adapter, connector._metrics)
+
+    def _instrument(self, adapter: Adapter, metrics: Metrics) -> Adapter:
+        view = self._views.get(id(adapter))
+        # ids are reused after reconnect, so the view is checked against both
+        if view is None or view._adapter is not adapter or view._metrics is not metrics:
+            name = getattr(self.config, "name", None) or ""
+            view = self._views[id(adapter)] = Instrumented(adapter, metrics, name)
+        return cast(Adapter, view)
+
+    @property
+    def cache(self) -> Optional[LocalCache]:
+        connector = self._connector or self._get_connector()
+        return connector._cache
+
+    @property
+    def metrics(self) -> Optional[Metrics]:
+        connector = self._connector or self._get_connector()
+        return connector._metrics
+
+    @property
+    def read_adapter(self) -> Adapter:
+        connector = self._connector or self._get_connector()
+        if self._read_from != "replica" or not connector._replicas:
+            return self.adapter
+        replicas = connector._replicas
+        if connector._read_selection == "latency":
+            latency = connector._replica_latency
+            replica = replicas[min(range(len(replicas)), key=latency.__getitem__)]
+        else:
+            connector._read_index = (connector._read_index + 1) % len(replicas)
+            replica = replicas[connector._read_index]
+        return self._view(replica)
 
     def _get_connector(self) -> "Connector":
         cfg = self.config.get("connection")
@@ -100,6 +262,7 @@ class Connector(
         return result.new_parent(
             joiner=self._joiner,
             format=self.config.get("format"),
+            read_from=self._read_from,
         )
 
     def __getattr__(self, item):
@@ -175,6 +338,12 @@ class Connector(
             address = "redis://{}:{}".format(host, port)
         if "maxsize" in cfg:
             cfg["max_size"] = cfg.pop("maxsize")
+        self._max_size = cfg.get("max_size")
+        self._cluster = bool(cfg.get("cluster"))
+        replicas = list(cfg.pop("replicas", None) or ())
+        sentinel = cfg.pop("sentinel", None)
+        self._read_selection = cfg.pop("read_selection", self._read_selection)
+        probe_interval = float(cfg.pop("read_probe_interval", 5))
 
         client_name = cfg.pop("client", None)
         priority = {
@@ -193,15 +362,258 @@ class Connector(
                 else:
                     continue
             else:
+                if sentinel:
+                    address, discovered = await self._discover(factory, sentinel)
+                    replicas.extend(discovered)
                 self._adapter_holder = factory(logger=self.logger)
                 self.logger.info("Create client with address %s", address)
                 self._adapter = await self._adapter_holder.__aenter__(address, **cfg)
+                if self._cluster:
+                    await self._connect_nodes(factory, address, cfg)
+                if not self.config.get_bool("autopipeline", default=False):
+                    pass
+                elif hasattr(self._adapter, "execute_many"):
+                    window = self.config.get_duration("autopipeline_window", default=0)
+                    self._adapter = cast(Adapter, AutoPipeline(self._adapter, window=window))
+                else:
+                    # separate round trips gathered together are slower than no batching at all
+                    self.logger.warning("Autopipeline is disabled: client does not support pipelines")
+                if metrics := self.config.get("metrics"):
+                    self._start_metrics(metrics)
+                for script in self._scripts:
+                    await self.load_script(script)
+                for replica in replicas:
+                    holder = factory(logger=self.logger)
+                    self.logger.info("Create replica client with address %s", replica)
+                    self._replicas.append(await holder.__aenter__(replica, **cfg))
+                    self._replica_holders.append(holder)
+                if self._replicas and self._read_selection == "latency":
+                    self._replica_latency = [0.0] * len(self._replicas)
+                    await self._probe_replicas()
+                    self._probing = asyncio.create_task(self._probe_loop(probe_interval))
+                if local_cache := self.config.get("local_cache"):
+                    self._start_cache(local_cache)
                 self._is_ready.set()
                 break
         else:
             raise ImportError("Try loading plugins " + ",".join(e.name for e in entry_points))
 
+    async def _connect_nodes(self, factory: Type[AdapterHolder], address, cfg: Dict[str, Any]):
+        # commands without a key (SCAN, SCRIPT LOAD) have to be sent to every primary
+        seed = address
+        while not isinstance(seed, str):
+            seed = seed[0]
+        cfg = dict(cfg, cluster=False)
+        holder = factory(logger=self.logger)
+        adapter = await holder.__aenter__(seed, **cfg)
+        try:
+            slots = await adapter.execute("CLUSTER", "SLOTS")
+        finally:
+            await holder.__aexit__(None, None, None)
+        for node in primaries(slots):
+            holder = factory(logger=self.logger)
+            self.logger.info("Create client for cluster node %s", node)
+            self._nodes.append(await holder.__aenter__(node, **cfg))
+            self._node_holders.append(holder)
+
+    async def _discover(self, factory: Type[AdapterHolder], sentinel) -> Tuple[str, List[str]]:
+        service = sentinel.get("service")
+        addresses = sentinel.get("addresses") or [sentinel.get("address")]
+        for address in addresses:
+            holder = factory(logger=self.logger)
+            try:
+                adapter = await holder.__aenter__(address)
+                try:
+                    primary = await adapter.execute("SENTINEL", "get-master-addr-by-name", service)
+                    replicas = await adapter.execute("SENTINEL", "replicas", service)
+                finally:
+                    await holder.__aexit__(None, None, None)
+            except Exception as e:
+                self.logger.warning("Sentinel %s is not available: %r", address, e)
+                continue
+            if not primary:
+                raise ValueError("Sentinel %s does not know %r" % (address, service))
+            host, port = (i.decode() if isinstance(i, bytes) else i for i in primary)
+            result = []
+            for replica in replicas:
+                info = {}
+                for k, v in zip(replica[::2], replica[1::2]):
+                    info[k.decode() if isinstance(k, bytes) else k] = v.decode() if isinstance(v, bytes) else v
+                flags = info.get("flags", "").split(",")
+                if not {"s_down", "o_down", "disconnected"}.intersection(flags):
+                    result.append("redis://{}:{}".format(info["ip"], info["port"]))
+            self.logger.info("Sentinel %s found %r at %s:%s", address, service, host, port)
+            return "redis://{}:{}".format(host, port), result
+        raise ConnectionError("No sentinel available for %r" % service)
+
+    async def _probe_replicas(self):
+        for i, adapter in enumerate(self._replicas):
+            started = time.monotonic()
+            try:
+                await adapter.execute("PING")
+            except Exception:
+                self._replica_latency[i] = float("inf")
+                continue
+            latency = time.monotonic() - started
+            previous = self._replica_latency[i]
+            if previous and previous != float("inf"):
+                latency = previous * 0.8 + latency * 0.2
+            self._replica_latency[i] = latency
+
+    async def _probe_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            await self._probe_replicas()
+
+    def _start_metrics(self, config: Union[bool, ValueExtractor]):
+        self._metrics = Metrics()
+        if not isinstance(config, ValueExtractor) or not config.get("export"):
+            return
+        export = config.get("export")
+        if export.startswith("."):
+            target = self.context.get_object(export)
+        else:
+            target = import_name(export)
+        interval = config.get_duration("interval", default=60)
+        self._exporting = asyncio.create_task(self._export_loop(target, interval))
+
+    async def _export(self, target):
+        assert self._metrics is not None
+        if callable(target):
+            result = target(self._metrics)
+        else:
+            result = target.set(self.config.name, self._metrics.snapshot())
+        if asyncio.iscoroutine(result):
+            await result
+
+    async def _export_loop(self, target, interval: float):
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await self._export(target)
+                except Exception:
+                    self.logger.exception("Export of metrics failed")
+        finally:
+            with contextlib.suppress(Exception):
+                await self._export(target)
+
+    def _start_cache(self, config: ValueExtractor):
+        ttl = config.get_duration("ttl", default=None, null=True)
+        tracking = getattr(self._adapter, "tracking", None)
+        if self._cluster:
+            tracking = None
+        if tracking is None and not ttl:
+            self.logger.warning("Local cache is disabled: client does not support tracking and ttl is not set")
+            return
+        self._cache = LocalCache(size=config.get_int("size", default=10000), ttl=ttl)
+        if tracking is None:
+            self.logger.info("Client does not support tracking, local cache entries expire after %ss", ttl)
+            self._cache.active = True
+        else:
+            self._tracking = asyncio.create_task(self._track(tracking))
+
+    async def _track(self, tracking):
+        cache = self._cache
+        assert cache is not None
+        prefixes = [self._prefix] if self._prefix else []
+        # redis-py may turn a cancelled read into TimeoutError or drop it,
+        # so disconnect is seen by _tracking
+        while self._tracking is not None:
+            events = tracking(*prefixes)
+            try:
+                async for keys in events:
+                    if self._tracking is None:
+                        break
+                    elif keys is None:
+                        cache.clear()
+                        cache.active = True
+                        continue
+                    for k in keys:
+                        cache.invalidate(k.decode() if isinstance(k, bytes) else k)
+            except Exception:
+                if self._tracking is not None:
+                    self.logger.exception("Tracking of local cache failed")
+            finally:
+                await events.aclose()
+            if self._tracking is None:
+                break
+            cache.active = False
+            cache.clear()
+            await asyncio.sleep(1)
+
+    async def _gather_slots(self, raw_keys: List[str], call: Callable[[List[int]], Awaitable[Any]]) -> List[Any]:
+        connector = self._connector or self._get_connector()
+        if connector._cluster:
+            groups = group_by_slot(raw_keys)
+        else:
+            groups = [list(range(len(raw_keys)))]
+        replies = await asyncio.gather(*(call(group) for group in groups))
+        result: List[Any] = [None] * len(raw_keys)
+        for group, reply in zip(groups, replies):
+            if isinstance(reply, list):
+                for i, value in zip(group, reply):
+                    result[i] = value
+        return result
+
+    def _script_sha(self, script: str) -> str:
+        connector = self._connector or self._get_connector()
+        sha = connector._scripts.get(script)
+        if sha is None:
+            sha = hashlib.sha1(script.encode()).hexdigest()
+            connector._scripts[script] = sha
+        return sha
+
+    async def load_script(self, script: str) -> str:
+        sha = None
+        for node in self.nodes:
+            sha = await node.execute("SCRIPT", "LOAD", script)
+        if sha is None:
+            sha = await self.adapter.execute("SCRIPT", "LOAD", script)
+        if isinstance(sha, bytes):
+            sha = sha.decode()
+        connector = self._connector or self._get_connector()
+        connector._scripts[script] = sha
+        return sha
+
+    def pipeline(self, transaction: bool = False) -> Pipeline:
+        return Pipeline(self, transaction=transaction)
+
+    async def eval_script(self, script: str, numkeys: int, *args) -> Any:
+        sha = self._script_sha(script)
+        try:
+            return await self.adapter.execute("EVALSHA", sha, numkeys, *args)
+        except Exception as e:
+            if not _is_noscript(e):
+                raise
+        self.logger.debug("Reload script %s", sha)
+        sha = await self.load_script(script)
+        return await self.adapter.execute("EVALSHA", sha, numkeys, *args)
+
     async def disconnect(self):
+        if task := self._tracking:
+            self._tracking = None
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        if task := self._probing:
+            self._probing = None
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        if task := self._exporting:
+            self._exporting = None
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        for holder in self._replica_holders + self._node_holders:
+            await holder.__aexit__(None, None, None)
+        self._replicas = []
+        self._replica_holders = []
+        self._nodes = []
+        self._node_holders = []
+        if isinstance(self._adapter, AutoPipeline):
+            await self._adapter.drain()
         if adapter := self._adapter_holder:
             self.logger.debug("Close connection")
             await adapter.__aexit__(None, None, None)
@@ -229,6 +641,9 @@ class KeyEntity(Connector):
             self._key = self.raw_key(self.config.key)
         return self._key
 
+    def _subkey(self, *parts: str) -> str:
+        return self._joiner.join([self.key, *parts])
+
     def factory(self, item, config=None):
         inst = super().factory(item, config=config)
         inst._prefix = self.raw_key(self.config.key)
@@ -241,14 +656,27 @@ class BaseQueue(KeyEntity, AbstractQueue):
         super().set_config(config)
         self._blocking: bool = self.config.get_bool("blocking", default=True)
         self._timeout: float = self.config.get_float("timeout", default=0)
+        self._chunk_size: int = self.config.get_int("chunk_size", default=1000)
+        self._consumers: int = self.config.get_int("consumers", default=1)
 
     async def init(self):
-        self._lock = asyncio.Lock()
+        self._lock = asyncio.Semaphore(self._consumers)
         await super().init()
 
+    async def connect(self):
+        await super().connect()
+        connector = self._connector or self._get_connector()
+        max_size = connector._max_size
+        if max_size and self._consumers > max_size:
+            self.logger.warning("Consumers %s limited by max_size %s", self._consumers, max_size)
+            self._consumers = max_size
+            self._lock = asyncio.Semaphore(self._consumers)
+
     def factory(self, item, config=None):
         inst = super().factory(item, config=config)
-        inst._lock = asyncio.Lock()
+        inst._consumers = self._consumers
+        inst._lock = asyncio.Semaphore(self._consumers)
         inst._blocking = self._blocking
         inst._timeout = self._timeout
+        inst._chunk_size = self._chunk_size
         return inst
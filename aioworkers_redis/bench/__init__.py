@@ -0,0 +1,279 @@
+import asyncio
+import contextlib
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence
+
+from aioworkers.core.config import Config
+from aioworkers.core.context import Context
+from aioworkers.core.plugin import iter_entry_points
+
+DEFAULT_ADDRESS = "redis://localhost:6379"
+DEFAULT_SIZES = (16, 1024, 16384)
+DEFAULT_CONCURRENCY = (1, 16, 64)
+DEFAULT_REQUESTS = 1000
+DEFAULT_TIMEOUT = 60.0
+
+Op = Callable[[Any, int, bytes], Awaitable[Any]]
+
+
+class Scenario(NamedTuple):
+    config: Dict[str, Any]
+    op: Op
+    setup: Optional[Callable[[Any, int, bytes], Awaitable[Any]]] = None
+
+
+def _item(i: int, payload: bytes) -> bytes:
+    return b"%d:%s" % (i, payload)
+
+
+async def _queue_fill(q, n: int, payload: bytes):
+    await q.put_many([payload] * n)
+
+
+async def _zqueue_fill(q, n: int, payload: bytes):
+    for i in range(0, n, 100):
+        await asyncio.gather(*(q.put(_item(j, payload), j) for j in range(i, min(i + 100, n))))
+
+
+async def _ts_zqueue_fill(q, n: int, payload: bytes):
+    now = time.time()
+    for i in range(0, n, 100):
+        await asyncio.gather(*(q.put(_item(j, payload), now - n + j) for j in range(i, min(i + 100, n))))
+
+
+async def _storage_fill(s, n: int, payload: bytes):
+    for i in range(0, n, 100):
+        await s.set_many({str(j): payload for j in range(i, min(i + 100, n))})
+
+
+async def _hash_fill(s, n: int, payload: bytes):
+    for i in range(0, n, 100):
+        await asyncio.gather(*(s.set(str(j), payload, field="v") for j in range(i, min(i + 100, n))))
+
+
+async def _hll_fill(s, n: int, payload: bytes):
+    for i in range(0, n, 100):
+        await s.set_many([_item(j, payload) for j in range(i, min(i + 100, n))])
+
+
+async def _xqueue_fill(q, n: int, payload: bytes):
+    await q.put_many([{"v": payload}] * n)
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "queue.put": Scenario(
+        {"cls": "aioworkers_redis.queue.Queue"},
+        lambda q, i, payload: q.put(payload),
+    ),
+    "queue.get": Scenario(
+        {"cls": "aioworkers_redis.queue.Queue"},
+        lambda q, i, payload: q.get(),
+        _queue_fill,
+    ),
+    "zqueue.put": Scenario(
+        {"cls": "aioworkers_redis.queue.ZQueue"},
+        lambda q, i, payload: q.put(_item(i, payload), i),
+    ),
+    "zqueue.get": Scenario(
+        {"cls": "aioworkers_redis.queue.ZQueue"},
+        lambda q, i, payload: q.get(),
+        _zqueue_fill,
+    ),
+    "ts_zqueue.put": Scenario(
+        {"cls": "aioworkers_redis.queue.TimestampZQueue"},
+        lambda q, i, payload: q.put(_item(i, payload)),
+    ),
+    "ts_zqueue.get": Scenario(
+        {"cls": "aioworkers_redis.queue.TimestampZQueue"},
+        lambda q, i, payload: q.get(),
+        _ts_zqueue_fill,
+    ),
+    "storage.set": Scenario(
+        {"cls": "aioworkers_redis.storage.Storage"},
+        lambda s, i, payload: s.set(str(i), payload),
+    ),
+    "storage.get": Scenario(
+        {"cls": "aioworkers_redis.storage.Storage"},
+        lambda s, i, payload: s.get(str(i)),
+        _storage_fill,
+    ),
+    "hash.set": Scenario(
+        {"cls": "aioworkers_redis.storage.HashStorage"},
+        lambda s, i, payload: s.set(str(i), payload, field="v"),
+    ),
+    "hash.get": Scenario(
+        {"cls": "aioworkers_redis.storage.HashStorage"},
+        lambda s, i, payload: s.get(str(i), field="v"),
+        _hash_fill,
+    ),
+    "hll.set": Scenario(
+        {"cls": "aioworkers_redis.storage.HyperLogLogStorage"},
+        lambda s, i, payload: s.set(_item(i, payload)),
+    ),
+    "hll.get": Scenario(
+        {"cls": "aioworkers_redis.storage.HyperLogLogStorage"},
+        lambda s, i, payload: s.get(_item(i, payload)),
+        _hll_fill,
+    ),
+    "xqueue.put": Scenario(
+        {"cls": "aioworkers_redis.stream.XQueue", "group_name": "bench"},
+        lambda q, i, payload: q.put({"v": payload}),
+    ),
+    "xqueue.get": Scenario(
+        {"cls": "aioworkers_redis.stream.XQueue", "group_name": "bench"},
+        lambda q, i, payload: q.get(),
+        _xqueue_fill,
+    ),
+}
+
+
+def available_adapters() -> List[str]:
+    result = []
+    for p in iter_entry_points(group="aioworkers_redis"):
+        try:
+            p.load()
+        except ImportError:
+            continue
+        result.append(p.name)
+    return result
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """
+    >>> percentile([3, 1, 2, 4], 0.5)
+    2
+    >>> percentile([3, 1, 2, 4], 0.99)
+    4
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))]
+
+
+@contextlib.contextmanager
+def fake_server() -> Iterator[str]:
+    try:
+        from fakeredis import TcpFakeServer
+    except ImportError as e:
+        raise ImportError("Install fakeredis[lua]>=2.24 to benchmark against an in-process fake") from e
+
+    server = TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        host, port = server.server_address[:2]
+        yield f"redis://{host}:{port}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+async def _cleanup(adapter, prefix: str):
+    cursor = b"0"
+    while True:
+        cursor, keys = await adapter.execute("SCAN", cursor, "MATCH", prefix + "*", "COUNT", 1000)
+        if keys:
+            await adapter.execute("DEL", *keys)
+        if cursor in (b"0", 0, "0"):
+            break
+
+
+async def _measure(entity, op: Op, payload: bytes, requests: int, concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                await op(entity, i, payload)
+            except Exception:
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "errors": errors,
+        "seconds": elapsed,
+        "ops_per_sec": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+async def run_scenario(
+    name: str,
+    *,
+    address: str = DEFAULT_ADDRESS,
+    adapter: Optional[str] = None,
+    size: int = DEFAULT_SIZES[0],
+    concurrency: int = DEFAULT_CONCURRENCY[0],
+    requests: int = DEFAULT_REQUESTS,
+) -> Dict[str, Any]:
+    scenario = SCENARIOS[name]
+    prefix = f"bench:{uuid.uuid4()}"
+    redis: Dict[str, Any] = {"cls": "aioworkers_redis.base.Connector", "connection": {"address": address}}
+    if adapter:
+        redis["client"] = adapter
+    config = dict(scenario.config, prefix=prefix, key="k", connection=".redis")
+    payload = b"x" * size
+    async with Context(Config(redis=redis, bench=config)) as ctx:
+        entity = ctx.bench
+        try:
+            if scenario.setup:
+                await scenario.setup(entity, requests, payload)
+            result = await _measure(entity, scenario.op, payload, requests, concurrency)
+        finally:
+            await _cleanup(entity.adapter, prefix)
+    return dict(
+        scenario=name,
+        adapter=adapter or type(entity.adapter).__name__,
+        payload_size=size,
+        concurrency=concurrency,
+        **result,
+    )
+
+
+async def run(
+    *,
+    address: str = DEFAULT_ADDRESS,
+    adapters: Optional[Iterable[str]] = None,
+    scenarios: Optional[Iterable[str]] = None,
+    sizes: Iterable[int] = DEFAULT_SIZES,
+    concurrency: Iterable[int] = DEFAULT_CONCURRENCY,
+    requests: int = DEFAULT_REQUESTS,
+    timeout: Optional[float] = DEFAULT_TIMEOUT,
+    progress: Optional[Callable[[Dict[str, Any]], Any]] = None,
+) -> List[Dict[str, Any]]:
+    results = []
+    for adapter in adapters or available_adapters():
+        for name in scenarios or SCENARIOS:
+            for size in sizes:
+                for c in concurrency:
+                    try:
+                        result = await asyncio.wait_for(
+                            run_scenario(
+                                name,
+                                address=address,
+                                adapter=adapter,
+                                size=size,
+                                concurrency=c,
+                                requests=requests,
+                            ),
+                            timeout,
+                        )
+                    except Exception as e:
+                        result = dict(scenario=name, adapter=adapter, payload_size=size, concurrency=c, error=repr(e))
+                    if progress:
+                        progress(result)
+                    results.append(result)
+    return results
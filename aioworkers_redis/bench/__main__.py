@@ -0,0 +1,93 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import platform
+import sys
+from typing import List, Optional
+
+from aioworkers_redis import __version__
+from aioworkers_redis.bench import (
+    DEFAULT_ADDRESS,
+    DEFAULT_CONCURRENCY,
+    DEFAULT_REQUESTS,
+    DEFAULT_SIZES,
+    DEFAULT_TIMEOUT,
+    SCENARIOS,
+    available_adapters,
+    fake_server,
+    run,
+)
+
+
+def _ints(value: str) -> List[int]:
+    return [int(i) for i in value.split(",")]
+
+
+def _names(value: str) -> List[str]:
+    return [i.strip() for i in value.split(",") if i.strip()]
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="aioworkers-redis-bench",
+        description="Measure ops/sec and latency of aioworkers-redis entities",
+    )
+    parser.add_argument("--address", default=DEFAULT_ADDRESS, help="redis server, default %(default)s")
+    parser.add_argument("--fake", action="store_true", help="run against in-process fakeredis instead of --address")
+    parser.add_argument("--adapters", type=_names, help="comma separated, default all installed")
+    parser.add_argument("--scenarios", type=_names, help="comma separated from: " + ", ".join(SCENARIOS))
+    parser.add_argument("--sizes", type=_ints, default=list(DEFAULT_SIZES), help="payload sizes in bytes")
+    parser.add_argument("--concurrency", type=_ints, default=list(DEFAULT_CONCURRENCY))
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS, help="operations per measurement")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="seconds per measurement")
+    parser.add_argument("-o", "--output", help="write JSON report to file instead of stdout")
+    parser.add_argument("-q", "--quiet", action="store_true", help="do not print progress to stderr")
+    args = parser.parse_args(argv)
+    for name in args.scenarios or ():
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario {name!r}")
+    return args
+
+
+def progress(result):
+    line = "{adapter:>10} {scenario:<14} {payload_size:>7}B x{concurrency:<4}"
+    if "error" in result:
+        line += " {error}"
+    else:
+        line += " {ops_per_sec:>10.0f} ops/s p50 {p50_ms:.3f}ms p99 {p99_ms:.3f}ms errors {errors}"
+    print(line.format(**result), file=sys.stderr)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    with contextlib.ExitStack() as stack:
+        address = stack.enter_context(fake_server()) if args.fake else args.address
+        results = asyncio.run(
+            run(
+                address=address,
+                adapters=args.adapters,
+                scenarios=args.scenarios,
+                sizes=args.sizes,
+                concurrency=args.concurrency,
+                requests=args.requests,
+                timeout=args.timeout,
+                progress=None if args.quiet else progress,
+            )
+        )
+    report = {
+        "version": __version__,
+        "python": platform.python_version(),
+        "server": "fakeredis" if args.fake else args.address,
+        "adapters": args.adapters or available_adapters(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Set, Tuple
+
+
+class LocalCache:
+    def __init__(self, size: int = 10000, ttl: Optional[float] = None):
+        self._size = size
+        self._ttl = ttl
+        self._data: "OrderedDict[Tuple[str, Hashable], Tuple[Optional[float], Any]]" = OrderedDict()
+        self._index: Dict[str, Set[Hashable]] = {}
+        self.epoch = 0
+        self.active = False
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str, sub: Hashable = None) -> Tuple[bool, Any]:
+        item = self._data.get((key, sub))
+        if item is not None:
+            expires, value = item
+            if expires is None or expires > time.monotonic():
+                self._data.move_to_end((key, sub))
+                self.hits += 1
+                return True, value
+            self._remove((key, sub))
+        self.misses += 1
+        return False, None
+
+    def set(self, key: str, value: Any, sub: Hashable = None, *, epoch: Optional[int] = None):
+        if not self.active or epoch is not None and epoch != self.epoch:
+            return
+        expires = time.monotonic() + self._ttl if self._ttl else None
+        self._data[key, sub] = expires, value
+        self._data.move_to_end((key, sub))
+        self._index.setdefault(key, set()).add(sub)
+        while len(self._data) > self._size:
+            k, _ = self._data.popitem(last=False)
+            self._unindex(k)
+
+    def invalidate(self, key: str):
+        self.epoch += 1
+        for sub in self._index.pop(key, ()):
+            self._data.pop((key, sub), None)
+
+    def clear(self):
+        self.epoch += 1
+        self._data.clear()
+        self._index.clear()
+
+    def _remove(self, k: Tuple[str, Hashable]):
+        del self._data[k]
+        self._unindex(k)
+
+    def _unindex(self, k: Tuple[str, Hashable]):
+        key, sub = k
+        subs = self._index.get(key)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del self._index[key]
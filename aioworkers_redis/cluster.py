@@ -0,0 +1,67 @@
+from typing import Any, Dict, Iterable, List, Union
+
+SLOTS = 16384
+
+
+def _crc16_table() -> List[int]:
+    table = []
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            crc = (crc << 1) ^ 0x1021 if crc & 0x8000 else crc << 1
+        table.append(crc & 0xFFFF)
+    return table
+
+
+_CRC16_TABLE = _crc16_table()
+
+
+def crc16(data: bytes) -> int:
+    crc = 0
+    for b in data:
+        crc = ((crc << 8) & 0xFFFF) ^ _CRC16_TABLE[(crc >> 8) ^ b]
+    return crc
+
+
+def key_slot(key: Union[str, bytes]) -> int:
+    """
+    >>> key_slot("foo")
+    12182
+    >>> key_slot("app:{user1}:a") == key_slot("app:{user1}:b")
+    True
+    """
+    if isinstance(key, str):
+        key = key.encode()
+    start = key.find(b"{")
+    if start >= 0:
+        end = key.find(b"}", start + 1)
+        if end > start + 1:
+            key = key[start + 1 : end]
+    return crc16(key) % SLOTS
+
+
+def group_by_slot(keys: Iterable[Union[str, bytes]]) -> List[List[int]]:
+    groups: Dict[int, List[int]] = {}
+    for i, key in enumerate(keys):
+        groups.setdefault(key_slot(key), []).append(i)
+    return list(groups.values())
+
+
+def primaries(slots: List[Any]) -> List[str]:
+    """
+    >>> primaries([
+    ...     [0, 5460, [b"127.0.0.1", 7000, b"a"]],
+    ...     [5461, 10922, [b"127.0.0.1", 7001, b"b"], [b"127.0.0.1", 7004, b"e"]],
+    ...     [10923, 16383, [b"127.0.0.1", 7000, b"a"]],
+    ... ])
+    ['redis://127.0.0.1:7000', 'redis://127.0.0.1:7001']
+    """
+    result: List[str] = []
+    for item in slots:
+        host, port = item[2][0], item[2][1]
+        if isinstance(host, bytes):
+            host = host.decode()
+        address = "redis://{}:{}".format(host or "localhost", port)
+        if address not in result:
+            result.append(address)
+    return result
@@ -0,0 +1,170 @@
+import inspect
+import time
+from bisect import bisect_left
+from typing import Any, Awaitable, Dict, List, Sequence, Tuple
+
+from aioworkers_redis.adapter import Adapter, Value
+
+METHODS = {"delete": "DEL"}
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, float("inf"))
+
+
+def size(value: Any) -> int:
+    """
+    >>> size([b"OK", "abc", 12, None])
+    7
+    >>> size({"f": b"v"})
+    2
+    """
+    if isinstance(value, (bytes, bytearray, memoryview, str)):
+        return len(value)
+    elif isinstance(value, (list, tuple)):
+        return sum(size(i) for i in value)
+    elif isinstance(value, dict):
+        return sum(size(k) + size(v) for k, v in value.items())
+    elif isinstance(value, (int, float)):
+        return len(str(value))
+    return 0
+
+
+def _command(name: Value) -> str:
+    if isinstance(name, bytes):
+        name = name.decode()
+    return str(name).upper()
+
+
+class CommandStats:
+    __slots__ = ("count", "errors", "sent", "received", "total", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.sent = 0
+        self.received = 0
+        self.total = 0.0
+        self.buckets = [0] * len(BUCKETS)
+
+
+class Metrics:
+    def __init__(self):
+        self._stats: Dict[Tuple[str, str], CommandStats] = {}
+
+    def record(self, entity: str, command: str, elapsed: float, sent: int = 0, received: int = 0, error: bool = False):
+        stats = self._stats.get((entity, command))
+        if stats is None:
+            stats = self._stats[entity, command] = CommandStats()
+        stats.count += 1
+        stats.errors += error
+        stats.sent += sent
+        stats.received += received
+        stats.total += elapsed
+        stats.buckets[bisect_left(BUCKETS, elapsed)] += 1
+
+    def reset(self):
+        self._stats.clear()
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "entity": entity,
+                "command": command,
+                "count": stats.count,
+                "errors": stats.errors,
+                "sent_bytes": stats.sent,
+                "received_bytes": stats.received,
+                "seconds": stats.total,
+                "buckets": dict(zip(BUCKETS, stats.buckets)),
+            }
+            for (entity, command), stats in sorted(self._stats.items())
+        ]
+
+    def prometheus(self, namespace: str = "redis") -> str:
+        """
+        >>> m = Metrics()
+        >>> m.record("q", "LPOP", 0.002, sent=8, received=3)
+        >>> print(m.prometheus())  # doctest: +ELLIPSIS
+        # TYPE redis_command_duration_seconds histogram
+        redis_command_duration_seconds_bucket{entity="q",command="LPOP",le="0.0005"} 0
+        redis_command_duration_seconds_bucket{entity="q",command="LPOP",le="0.001"} 0
+        redis_command_duration_seconds_bucket{entity="q",command="LPOP",le="0.0025"} 1
+        ...
+        redis_command_duration_seconds_bucket{entity="q",command="LPOP",le="+Inf"} 1
+        redis_command_duration_seconds_sum{entity="q",command="LPOP"} 0.002
+        redis_command_duration_seconds_count{entity="q",command="LPOP"} 1
+        # TYPE redis_command_errors_total counter
+        redis_command_errors_total{entity="q",command="LPOP"} 0
+        # TYPE redis_command_sent_bytes_total counter
+        redis_command_sent_bytes_total{entity="q",command="LPOP"} 8
+        # TYPE redis_command_received_bytes_total counter
+        redis_command_received_bytes_total{entity="q",command="LPOP"} 3
+        """
+        items = sorted(self._stats.items())
+        labels = ['entity="{}",command="{}"'.format(entity, command) for (entity, command), _ in items]
+        name = namespace + "_command_duration_seconds"
+        lines = ["# TYPE {} histogram".format(name)]
+        for label, (_, stats) in zip(labels, items):
+            cumulative = 0
+            for le, n in zip(BUCKETS, stats.buckets):
+                cumulative += n
+                le_label = "+Inf" if le == float("inf") else repr(le)
+                lines.append('{}_bucket{{{},le="{}"}} {}'.format(name, label, le_label, cumulative))
+            lines.append("{}_sum{{{}}} {}".format(name, label, stats.total))
+            lines.append("{}_count{{{}}} {}".format(name, label, stats.count))
+        for suffix, attr in (
+            ("errors_total", "errors"),
+            ("sent_bytes_total", "sent"),
+            ("received_bytes_total", "received"),
+        ):
+            name = "{}_command_{}".format(namespace, suffix)
+            lines.append("# TYPE {} counter".format(name))
+            for label, (_, stats) in zip(labels, items):
+                lines.append("{}{{{}}} {}".format(name, label, getattr(stats, attr)))
+        return "\n".join(lines)
+
+
+class Instrumented:
+    def __init__(self, adapter: Adapter, metrics: Metrics, entity: str):
+        self._adapter = adapter
+        self._metrics = metrics
+        self._entity = entity
+        if hasattr(adapter, "execute_many"):
+            self.execute_many = self._execute_many
+
+    def __getattr__(self, name):
+        # the adapter's own methods are timed as is, so their replies keep the client's types
+        method = getattr(self._adapter, name)
+        if name.startswith("_") or not callable(method):
+            return method
+        command = _command(METHODS.get(name, name))
+
+        def call(*args, **kwargs):
+            started = time.perf_counter()
+            result = method(*args, **kwargs)
+            if inspect.isawaitable(result):
+                return self._timed(command, started, result, size(args) + size(list(kwargs.values())))
+            return result
+
+        return call
+
+    async def _timed(self, command: str, started: float, reply: Awaitable, sent: int) -> Any:
+        try:
+            result = await reply
+        except Exception:
+            self._metrics.record(self._entity, command, time.perf_counter() - started, sent, error=True)
+            raise
+        self._metrics.record(self._entity, command, time.perf_counter() - started, sent, size(result))
+        return result
+
+    async def execute(self, *args: Value) -> Any:
+        started = time.perf_counter()
+        return await self._timed(_command(args[0]), started, self._adapter.execute(*args), size(args))
+
+    async def _execute_many(self, commands: Sequence[Sequence[Any]], transaction: bool = False) -> List[Any]:
+        started = time.perf_counter()
+        results = await self._adapter.execute_many(commands, transaction=transaction)  # type: ignore
+        elapsed = time.perf_counter() - started
+        for args, result in zip(commands, results):
+            error = isinstance(result, BaseException)
+            received = 0 if error else size(result)
+            self._metrics.record(self._entity, _command(args[0]), elapsed, size(args), received, error)
+        return results
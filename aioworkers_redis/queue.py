@@ -1,5 +1,9 @@
 import asyncio
+import math
+import socket
 import time
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import uuid4
 
 from aioworkers.queue.base import score_queue
 
@@ -7,11 +11,84 @@ from aioworkers_redis.base import BaseQueue
 
 
 class Queue(BaseQueue):
+    def set_config(self, config):
+        super().set_config(config)
+        self._prefetch: int = self.config.get_int("prefetch", default=0)
+        self._buffer: Optional[asyncio.Queue] = None
+        self._prefetcher: Optional[asyncio.Task] = None
+
+    async def connect(self):
+        await super().connect()
+        if self._prefetch:
+            self._buffer = asyncio.Queue(self._prefetch)
+            self._buffer_free = asyncio.Event()
+            self._prefetching = True
+            self._prefetcher = asyncio.create_task(self._prefetch_loop())
+
+    async def disconnect(self):
+        await self._stop_prefetch()
+        await super().disconnect()
+
+    async def _stop_prefetch(self):
+        if self._prefetcher:
+            # Let the running round trip finish instead of cancelling it,
+            # so a value popped by redis is never dropped on the way back.
+            self._prefetching = False
+            self._buffer_free.set()
+            await self._prefetcher
+            self._prefetcher = None
+            await self._requeue()
+
+    async def _prefetch_loop(self):
+        assert self._buffer is not None
+        while self._prefetching:
+            size = self._buffer.maxsize - self._buffer.qsize()
+            if size <= 0:
+                self._buffer_free.clear()
+                await self._buffer_free.wait()
+                continue
+            try:
+                # config.timeout is not used here, disconnect waits for this round trip
+                values = await self._pop_many(size, timeout=1, block=1)
+            except TimeoutError:
+                continue
+            except Exception:
+                self.logger.exception("Prefetch error")
+                await asyncio.sleep(self._timeout or 1)
+                continue
+            for v in values:
+                self._buffer.put_nowait(v)
+
+    async def _requeue(self):
+        assert self._buffer is not None
+        values = []
+        while not self._buffer.empty():
+            values.append(self._buffer.get_nowait())
+        if values:
+            self.logger.debug("Requeue %s prefetched values", len(values))
+            await self.adapter.execute("LPUSH", self.key, *reversed(values))
+
+    async def _buffer_get(self, n: int, timeout: float):
+        assert self._buffer is not None
+        try:
+            value = await asyncio.wait_for(self._buffer.get(), timeout or None)
+        except asyncio.TimeoutError:
+            raise TimeoutError from None
+        values = [value]
+        while len(values) < n and not self._buffer.empty():
+            values.append(self._buffer.get_nowait())
+        self._buffer_free.set()
+        return values
+
     async def put(self, value):
         value = self.encode(value)
         return await self.adapter.rpush(self.key, value)
 
     async def get(self, *, timeout: float = 0):
+        if self._buffer is not None:
+            values = await self._buffer_get(1, timeout)
+            return self.decode(values[0])
+
         deadline: float = 0
         if timeout:
             deadline = time.monotonic() + timeout
@@ -31,11 +108,55 @@ class Queue(BaseQueue):
                 elif not self._blocking:
                     await asyncio.sleep(self._timeout)
 
+    async def put_many(self, values):
+        values = [self.encode(v) for v in values]
+        result = None
+        for i in range(0, len(values), self._chunk_size):
+            chunk = values[i : i + self._chunk_size]
+            result = await self.adapter.execute("RPUSH", self.key, *chunk)
+        return result
+
+    async def get_many(self, n: int, *, timeout: float = 0):
+        return [self.decode(v) for v in await self._get_many(n, timeout)]
+
+    async def _get_many(self, n: int, timeout: float) -> list:
+        if self._buffer is not None:
+            return await self._buffer_get(n, timeout)
+        return await self._pop_many(n, timeout=timeout)
+
+    async def _pop_many(self, n: int, *, timeout: float = 0, block: Optional[float] = None):
+        deadline: float = 0
+        if timeout:
+            deadline = time.monotonic() + timeout
+        if block is None:
+            block = max(timeout, self._timeout)
+
+        async with self._lock:
+            while True:
+                if result := await self._lpop(n):
+                    return result
+                elif self._blocking and (result := await self._blpop(block)):
+                    if n > 1 and (tail := await self._lpop(n - 1)):
+                        result.extend(tail)
+                    return result
+
+                if deadline and time.monotonic() > deadline:
+                    raise TimeoutError
+                elif not self._blocking:
+                    await asyncio.sleep(min(self._timeout, block))
+
+    async def _lpop(self, n: int) -> list:
+        return await self.adapter.execute("LPOP", self.key, n) or []
+
+    async def _blpop(self, timeout: float) -> list:
+        result = await self.adapter.blpop(self.key, timeout=timeout)
+        return list(result.values())
+
     async def length(self):
-        return await self.adapter.llen(self.key)
+        return await self.read_adapter.llen(self.key)
 
     async def list(self):
-        return [self.decode(i) for i in await self.adapter.lrange(self.key, 0, -1)]
+        return [self.decode(i) for i in await self.read_adapter.lrange(self.key, 0, -1)]
 
     async def remove(self, value):
         value = self.encode(value)
@@ -45,9 +166,212 @@ class Queue(BaseQueue):
         return await self.adapter.delete(self.key)
 
 
+class ReliableQueue(Queue):
+    move_script = """
+        local result = {}
+        for i = 1, tonumber(ARGV[1]) do
+            local val = redis.call('LMOVE', KEYS[1], KEYS[2], 'LEFT', 'RIGHT')
+            if not val then break end
+            result[i] = val
+        end
+        return result
+        """
+    flush_script = """
+        local n = tonumber(ARGV[1])
+        for i = 2, n + 1 do
+            redis.call('LREM', KEYS[2], 1, ARGV[i])
+        end
+        for i = n + 2, #ARGV do
+            if redis.call('LREM', KEYS[2], 1, ARGV[i]) > 0 then
+                redis.call('RPUSH', KEYS[1], ARGV[i])
+            end
+        end
+        return #ARGV - 1
+        """
+    reap_script = """
+        if redis.call('EXISTS', KEYS[4]) == 1 then return -1 end
+        local n = 0
+        while redis.call('LMOVE', KEYS[2], KEYS[1], 'RIGHT', 'LEFT') do
+            n = n + 1
+        end
+        redis.call('SREM', KEYS[3], ARGV[1])
+        return n
+        """
+
+    def set_config(self, config):
+        super().set_config(config)
+        hostname = socket.gethostname()
+        self._consumer_name = self.config.get("consumer_name") or f"{hostname}-{uuid4()}"
+        self._heartbeat: float = self.config.get_duration("heartbeat", default=10)
+        self._ack_batch: int = self.config.get_int("ack_batch", default=100)
+        self._ack_interval: float = self.config.get_duration("ack_interval", default=0.1)
+        self._acks: List[bytes] = []
+        self._nacks: List[bytes] = []
+        self._delivered: Dict[int, List[Tuple[Any, bytes]]] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    def factory(self, item, config=None):
+        inst = super().factory(item, config=config)
+        inst._consumer_name = self._consumer_name
+        inst._heartbeat = self._heartbeat
+        inst._ack_batch = self._ack_batch
+        inst._ack_interval = self._ack_interval
+        return inst
+
+    @property
+    def processing_key(self) -> str:
+        return self._subkey("processing", self._consumer_name)
+
+    async def connect(self):
+        await super().connect()
+        for script in (self.move_script, self.flush_script, self.reap_script):
+            await self.load_script(script)
+        await self._beat()
+        self._tasks = [
+            asyncio.create_task(self._flush_loop()),
+            asyncio.create_task(self._reap_loop()),
+        ]
+
+    async def disconnect(self):
+        # redis-py may turn a cancel into an error, the loops stop on it without tasks
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # an in-flight BLMOVE can still fill the processing list, so it is reaped last
+        await self._stop_prefetch()
+        await self.flush()
+        await self.adapter.delete(self._subkey("consumer", self._consumer_name))
+        await self._reap(self._consumer_name)
+        self._delivered.clear()
+        await super().disconnect()
+
+    async def _requeue(self):
+        # Prefetched values are still in the processing list,
+        # they are returned to the queue with it on disconnect
+        assert self._buffer is not None
+        while not self._buffer.empty():
+            self._buffer.get_nowait()
+
+    async def _lpop(self, n: int) -> list:
+        return await self.eval_script(self.move_script, 2, self.key, self.processing_key, n) or []
+
+    async def _blpop(self, timeout: float) -> list:
+        result = await self.adapter.execute(
+            "BLMOVE",
+            self.key,
+            self.processing_key,
+            "LEFT",
+            "RIGHT",
+            timeout,
+        )
+        return [result] if result is not None else []
+
+    async def get(self, *, timeout: float = 0):
+        values = await self.get_many(1, timeout=timeout)
+        return values[0]
+
+    async def get_many(self, n: int, *, timeout: float = 0):
+        values = []
+        for raw in await self._get_many(n, timeout):
+            value = self.decode(raw)
+            # the popped bytes are removed on ack, the value may encode differently
+            self._delivered.setdefault(id(value), []).append((value, raw))
+            values.append(value)
+        return values
+
+    def _raw(self, value) -> bytes:
+        delivered = self._delivered.get(id(value))
+        if not delivered:
+            return self.encode(value)
+        _, raw = delivered.pop()
+        if not delivered:
+            del self._delivered[id(value)]
+        return raw
+
+    async def ack(self, value):
+        self._acks.append(self._raw(value))
+        await self._flush_if_full()
+
+    async def nack(self, value):
+        self._nacks.append(self._raw(value))
+        await self._flush_if_full()
+
+    async def _flush_if_full(self):
+        if not self._ack_interval or len(self._acks) + len(self._nacks) >= self._ack_batch:
+            await self.flush()
+
+    async def flush(self):
+        acks, self._acks = self._acks, []
+        nacks, self._nacks = self._nacks, []
+        if acks or nacks:
+            await self.eval_script(
+                self.flush_script,
+                2,
+                self.key,
+                self.processing_key,
+                len(acks),
+                *acks,
+                *nacks,
+            )
+
+    async def _flush_loop(self):
+        while self._tasks:
+            await asyncio.sleep(self._ack_interval or self._heartbeat)
+            try:
+                await self.flush()
+            except Exception:
+                if self._tasks:
+                    self.logger.exception("Flush acks error")
+
+    async def _beat(self):
+        await self.adapter.execute("SADD", self._subkey("consumers"), self._consumer_name)
+        await self.adapter.set(
+            self._subkey("consumer", self._consumer_name),
+            1,
+            ex=max(int(self._heartbeat), 1),
+        )
+
+    async def _reap(self, consumer_name: str) -> int:
+        return await self.eval_script(
+            self.reap_script,
+            4,
+            self.key,
+            self._subkey("processing", consumer_name),
+            self._subkey("consumers"),
+            self._subkey("consumer", consumer_name),
+            consumer_name,
+        )
+
+    async def reap(self):
+        consumers = await self.adapter.execute("SMEMBERS", self._subkey("consumers"))
+        for name in consumers:
+            if isinstance(name, bytes):
+                name = name.decode()
+            if name == self._consumer_name:
+                continue
+            n = await self._reap(name)
+            if n > 0:
+                self.logger.warning("Requeue %s values of dead consumer %r", n, name)
+
+    async def _reap_loop(self):
+        while self._tasks:
+            await asyncio.sleep(self._heartbeat / 2)
+            try:
+                await self._beat()
+                await self.reap()
+            except Exception:
+                if self._tasks:
+                    self.logger.exception("Reap error")
+
+
 class BaseZQueue(Queue):
     script = ""
 
+    async def connect(self):
+        await super().connect()
+        await self.load_script(self.script)
+
     async def put(self, value):
         score, val = value
         val = self.encode(val)
@@ -56,7 +380,7 @@ class BaseZQueue(Queue):
     async def get(self, *, timeout: float = 0):
         async with self._lock:
             while True:
-                lv = await self.adapter.eval(self.script, 1, self.key)
+                lv = await self.eval_script(self.script, 1, self.key)
                 if lv:
                     break
                 await asyncio.sleep(timeout or self.config.timeout)
@@ -64,10 +388,10 @@ class BaseZQueue(Queue):
         return float(score), self.decode(value)
 
     async def length(self):
-        return await self.adapter.zcard(self.key)
+        return await self.read_adapter.zcard(self.key)
 
     async def list(self):
-        return [self.decode(i) for i in await self.adapter.zrange(self.key, 0, -1)]
+        return [self.decode(i) for i in await self.read_adapter.zrange(self.key, 0, -1)]
 
     async def remove(self, value):
         value = self.encode(value)
@@ -82,27 +406,105 @@ class ZQueue(BaseZQueue):
         return val
         """
 
+    async def get(self, *, timeout: float = 0):
+        if not self._blocking:
+            return await super().get(timeout=timeout)
+        values = await self._zpop_many(1, timeout=timeout)
+        return values[0]
+
+    async def get_many(self, n: int, *, timeout: float = 0):
+        return await self._zpop_many(n, timeout=timeout)
+
+    async def _zpop_many(self, n: int, *, timeout: float = 0):
+        deadline: float = 0
+        if timeout:
+            deadline = time.monotonic() + timeout
+        timeout = max(timeout, self._timeout)
+
+        async with self._lock:
+            while True:
+                if result := await self.adapter.execute("ZPOPMIN", self.key, n):
+                    break
+                elif self._blocking and (result := await self.adapter.execute("BZPOPMIN", self.key, timeout)):
+                    result = list(result[1:])
+                    if n > 1 and (tail := await self.adapter.execute("ZPOPMIN", self.key, n - 1)):
+                        result.extend(tail)
+                    break
+
+                if deadline and time.monotonic() > deadline:
+                    raise TimeoutError
+                elif not self._blocking:
+                    await asyncio.sleep(self._timeout)
+        return [(float(s), self.decode(v)) for v, s in zip(result[::2], result[1::2])]
+
 
 @score_queue("time.time")
 class TimestampZQueue(BaseZQueue):
     script = """
-        local val = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+        local val = redis.call(
+            'ZRANGEBYSCORE', KEYS[1], '-inf', '(' .. ARGV[1],
+            'WITHSCORES', 'LIMIT', 0, tonumber(ARGV[2] or 1)
+        )
         if val[1] then
-            if tonumber(val[2]) < tonumber(ARGV[1]) then
-                redis.call('zrem', KEYS[1], val[1])
-            else
-                return nil
+            for i = 1, #val, 2 do
+                redis.call('ZREM', KEYS[1], val[i])
             end
+            return val
         end
-        return val
+        local head = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+        if head[1] then
+            return {false, head[2]}
+        end
+        return head
         """
+    put_script = """
+        local result = redis.call('ZADD', KEYS[1], ARGV[1], ARGV[2])
+        if redis.call('ZRANGE', KEYS[1], 0, 0)[1] == ARGV[2] then
+            redis.call('DEL', KEYS[2])
+            redis.call('RPUSH', KEYS[2], ARGV[1])
+            redis.call('EXPIRE', KEYS[2], 60)
+        end
+        return result
+        """
+
+    async def connect(self):
+        await super().connect()
+        await self.load_script(self.put_script)
+
+    @property
+    def wakeup_key(self) -> str:
+        return self._subkey("wakeup")
+
+    async def put(self, value):
+        score, val = value
+        val = self.encode(val)
+        return await self.eval_script(self.put_script, 2, self.key, self.wakeup_key, score, val)
 
     async def get(self, *, timeout: float = 0):
+        values = await self.get_many(1, timeout=timeout)
+        return values[0]
+
+    async def get_many(self, n: int, *, timeout: float = 0):
+        limit = timeout or self._timeout
         async with self._lock:
             while True:
-                lv = await self.adapter.eval(self.script, 1, self.key, time.time())
-                if lv:
+                lv = await self.eval_script(self.script, 1, self.key, time.time(), n)
+                if lv and lv[0] is not None:
                     break
-                await asyncio.sleep(timeout or self.config.timeout)
-        value, score = lv
-        return float(score), self.decode(value)
+                elif lv:
+                    # Nothing is due yet, wait until the earliest score
+                    delay = float(lv[1]) - time.time()
+                    if limit:
+                        delay = min(delay, limit)
+                    if delay <= 0:
+                        continue
+                    # BLPOP takes a timeout of a millisecond or less as 0 and blocks forever
+                    delay = max(math.ceil(delay * 1000) / 1000, 0.01)
+                else:
+                    delay = limit
+                if self._blocking:
+                    # put wakes us up earlier when it adds a new head
+                    await self.adapter.execute("BLPOP", self.wakeup_key, delay)
+                else:
+                    await asyncio.sleep(delay or self.config.timeout)
+        return [(float(s), self.decode(v)) for v, s in zip(lv[::2], lv[1::2])]
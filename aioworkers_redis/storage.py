@@ -1,3 +1,5 @@
+from typing import Any, AsyncIterator, List
+
 from aioworkers.storage.base import (
     AbstractBaseStorage,
     AbstractExpiryStorage,
@@ -10,6 +12,12 @@ from aioworkers_redis.base import Connector, KeyEntity
 
 class Storage(Connector, AbstractListedStorage, AbstractExpiryStorage):
     _expiry = None
+    set_many_script = """
+        for i, key in ipairs(KEYS) do
+            redis.call('SET', key, ARGV[i + 1], 'PX', ARGV[1])
+        end
+        return #KEYS
+        """
 
     def set_config(self, config):
         super().set_config(config)
@@ -18,14 +26,42 @@ class Storage(Connector, AbstractListedStorage, AbstractExpiryStorage):
             default=None,
             null=True,
         )
+        self._chunk_size: int = self.config.get_int("chunk_size", default=1000)
+
+    async def iter_keys(self, batch: int = 1000) -> AsyncIterator[str]:
+        pattern = self.raw_key("*")
+        # a SCAN cursor is only valid on the server that returned it
+        for adapter in self.nodes or [self.read_adapter]:
+            cursor = 0
+            while True:
+                cursor, keys = await adapter.execute("SCAN", cursor, "MATCH", pattern, "COUNT", batch)
+                for k in keys:
+                    yield self.clean_key(k)
+                if not int(cursor):
+                    break
 
     async def list(self):
-        keys = await self.adapter.keys(self.raw_key("*"))
-        return [self.clean_key(i) for i in keys]
+        # SCAN may return a key more than once
+        return list({k: None async for k in self.iter_keys()})
 
     async def length(self):
-        keys = await self.adapter.keys(self.raw_key("*"))
-        return len(keys)
+        return len({k async for k in self.iter_keys()})
+
+    async def _cached(self, raw_key, sub, fetch):
+        cache = self.cache
+        if cache is None:
+            return await fetch()
+        found, value = cache.get(raw_key, sub)
+        if not found:
+            epoch = cache.epoch
+            value = await fetch()
+            cache.set(raw_key, value, sub, epoch=epoch)
+        return value
+
+    def _invalidate(self, *raw_keys):
+        if (cache := self.cache) is not None:
+            for raw_key in raw_keys:
+                cache.invalidate(raw_key)
 
     async def set(self, key, value):
         raw_key = self.raw_key(key)
@@ -33,15 +69,17 @@ class Storage(Connector, AbstractListedStorage, AbstractExpiryStorage):
         if not is_null:
             value = self.encode(value)
         if is_null:
-            return await self.adapter.delete(raw_key)
+            result = await self.adapter.delete(raw_key)
         elif self._expiry:
-            return await self.adapter.set(raw_key, value, ex=self._expiry)
+            result = await self.adapter.set(raw_key, value, ex=self._expiry)
         else:
-            return await self.adapter.set(raw_key, value)
+            result = await self.adapter.set(raw_key, value)
+        self._invalidate(raw_key)
+        return result
 
     async def get(self, key):
         raw_key = self.raw_key(key)
-        value = await self.adapter.get(raw_key)
+        value = await self._cached(raw_key, None, lambda: self.read_adapter.get(raw_key))
         if value is not None:
             return self.decode(value)
 
@@ -49,44 +87,139 @@ class Storage(Connector, AbstractListedStorage, AbstractExpiryStorage):
         raw_key = self.raw_key(key)
         await self.adapter.expire(raw_key, expiry)
 
+    async def _mget(self, raw_keys: List[str]) -> List[Any]:
+        return await self._gather_slots(
+            raw_keys,
+            lambda group: self.read_adapter.execute("MGET", *(raw_keys[i] for i in group)),
+        )
+
+    async def _mset(self, raw_keys: List[str], values: List[Any]):
+        if self._expiry:
+            expiry = int(self._expiry * 1000)
+
+            def call(group):
+                return self.eval_script(
+                    self.set_many_script,
+                    len(group),
+                    *(raw_keys[i] for i in group),
+                    expiry,
+                    *(values[i] for i in group),
+                )
+        else:
+
+            def call(group):
+                return self.adapter.execute("MSET", *(x for i in group for x in (raw_keys[i], values[i])))
+
+        await self._gather_slots(raw_keys, call)
+
+    async def _delete_many(self, raw_keys: List[str]):
+        await self._gather_slots(
+            raw_keys,
+            lambda group: self.adapter.execute("DEL", *(raw_keys[i] for i in group)),
+        )
+
+    async def get_many(self, keys):
+        keys = list(keys)
+        result: List[Any] = []
+        for i in range(0, len(keys), self._chunk_size):
+            raw_keys = [self.raw_key(k) for k in keys[i : i + self._chunk_size]]
+            values = await self._mget(raw_keys)
+            result.extend(self.decode(v) for v in values)
+        return result
+
+    async def set_many(self, mapping):
+        items = list(mapping.items())
+        for i in range(0, len(items), self._chunk_size):
+            to_del = []
+            raw_keys = []
+            values = []
+            for key, value in items[i : i + self._chunk_size]:
+                if value is None:
+                    to_del.append(self.raw_key(key))
+                else:
+                    raw_keys.append(self.raw_key(key))
+                    values.append(self.encode(value))
+            if to_del:
+                await self._delete_many(to_del)
+                self._invalidate(*to_del)
+            if raw_keys:
+                await self._mset(raw_keys, values)
+                self._invalidate(*raw_keys)
+
 
 class HashStorage(FieldStorageMixin, Storage):
+    set_script = """
+        local n = 2 + 2 * tonumber(ARGV[2])
+        local result = 0
+        for i = 3, n, 2 do
+            result = result + redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+        end
+        for i = n + 1, #ARGV do
+            redis.call('HDEL', KEYS[1], ARGV[i])
+        end
+        if tonumber(ARGV[1]) > 0 then
+            redis.call('PEXPIRE', KEYS[1], ARGV[1])
+        end
+        return result
+        """
+    get_many_script = """
+        local result = {}
+        for i, key in ipairs(KEYS) do
+            if #ARGV > 0 then
+                result[i] = redis.call('HMGET', key, unpack(ARGV))
+            else
+                result[i] = redis.call('HGETALL', key)
+            end
+        end
+        return result
+        """
+
     async def set(self, key, value, *, field=None, fields=None):
         raw_key = self.raw_key(key)
+        if not field and value is None:
+            result = await self.adapter.delete(raw_key)
+            self._invalidate(raw_key)
+            return result
+        pairs: List[Any] = []
         to_del = []
         if field:
             if value is None:
                 to_del.append(field)
             else:
-                return await self.adapter.hset(raw_key, field, self.encode(value))
-        elif value is None:
-            return await self.adapter.delete(raw_key)
+                pairs.extend((field, self.encode(value)))
         else:
-            pairs = {}
             for f in fields or value:
                 v = value[f]
                 if v is None:
                     to_del.append(f)
                 else:
-                    pairs[f] = self.encode(v)
-            if pairs:
-                await self.adapter.hset(raw_key, mapping=pairs)
-        if to_del:
-            await self.adapter.hdel(raw_key, *to_del)
-        if self._expiry:
-            await self.adapter.expire(raw_key, self._expiry)
+                    pairs.extend((f, self.encode(v)))
+        expiry = int(self._expiry * 1000) if self._expiry else 0
+        result = await self.eval_script(
+            self.set_script,
+            1,
+            raw_key,
+            expiry,
+            len(pairs) // 2,
+            *pairs,
+            *to_del,
+        )
+        self._invalidate(raw_key)
+        return result
 
     async def get(self, key, *, field=None, fields=None):
         raw_key = self.raw_key(key)
         if field:
-            return self.decode(await self.adapter.hget(raw_key, field))
+            v = await self._cached(raw_key, field, lambda: self.read_adapter.hget(raw_key, field))
+            return self.decode(v)
         elif fields:
-            v = await self.adapter.hmget(raw_key, *fields)
+            fields = tuple(fields)
+            v = await self._cached(raw_key, fields, lambda: self.read_adapter.hmget(raw_key, *fields))
             m = self.model()
             for f, val in zip(fields, v):
                 m[f] = self.decode(val)
         else:
-            a = await self.adapter.hgetall(raw_key)
+            a = await self._cached(raw_key, True, lambda: self.read_adapter.hgetall(raw_key))
             m = self.model()
             for f, v in a.items():
                 if isinstance(f, bytes):
@@ -94,19 +227,92 @@ class HashStorage(FieldStorageMixin, Storage):
                 m[f] = self.decode(v)
         return m
 
+    async def _hget_many(self, raw_keys: List[str], fields: List[str]) -> List[Any]:
+        return await self._gather_slots(
+            raw_keys,
+            lambda group: self.eval_script(
+                self.get_many_script,
+                len(group),
+                *(raw_keys[i] for i in group),
+                *fields,
+            ),
+        )
+
+    async def get_many(self, keys, *, fields=None):
+        keys = list(keys)
+        fields = list(fields or ())
+        result = []
+        for i in range(0, len(keys), self._chunk_size):
+            raw_keys = [self.raw_key(k) for k in keys[i : i + self._chunk_size]]
+            for v in await self._hget_many(raw_keys, fields):
+                m = self.model()
+                if fields:
+                    pairs = zip(fields, v)
+                else:
+                    pairs = zip(v[::2], v[1::2])
+                for f, val in pairs:
+                    if isinstance(f, bytes):
+                        f = f.decode()
+                    m[f] = self.decode(val)
+                result.append(m)
+        return result
+
 
 class HyperLogLogStorage(KeyEntity, AbstractBaseStorage):
+    script = """
+        local origin = redis.call('GET', KEYS[1])
+        -- the key is restored below, so nothing goes to replicas or the AOF
+        redis.set_repl(redis.REPL_NONE)
+        local changed = false
+        local result = {}
+        for i, member in ipairs(ARGV) do
+            -- restored once after the loop: later members are checked
+            -- with the missing earlier ones of the same call added
+            if redis.call('PFADD', KEYS[1], member) == 1 then
+                result[i] = 0
+                changed = true
+            else
+                result[i] = 1
+            end
+        end
+        if changed and origin then
+            redis.call('SET', KEYS[1], origin, 'KEEPTTL')
+        elseif changed then
+            redis.call('DEL', KEYS[1])
+        end
+        return result
+        """
+
+    def set_config(self, config):
+        super().set_config(config)
+        self._chunk_size: int = self.config.get_int("chunk_size", default=1000)
+
+    async def connect(self):
+        await super().connect()
+        await self.load_script(self.script)
+
     async def set(self, key, value=True):
         assert value is True
         await self.adapter.pfadd(self.key, key)
 
+    async def set_many(self, keys):
+        keys = list(keys)
+        for i in range(0, len(keys), self._chunk_size):
+            await self.adapter.execute("PFADD", self.key, *keys[i : i + self._chunk_size])
+
     async def get(self, key):
-        tmp_key = self.raw_key("tmp:hhl:" + key)
-        await self.adapter.pfmerge(tmp_key, self.key)
-        result = await self.adapter.pfadd(tmp_key, key)
-        await self.adapter.delete(tmp_key)
-        return not result
+        result = await self.get_many([key])
+        return result[0]
+
+    async def get_many(self, keys):
+        keys = list(keys)
+        result: List[bool] = []
+        for i in range(0, len(keys), self._chunk_size):
+            chunk = keys[i : i + self._chunk_size]
+            values = await self.eval_script(self.script, 1, self.key, *chunk)
+            result.extend(bool(v) for v in values)
+        return result
 
     async def length(self):
-        c = await self.adapter.pfcount(self.key)
+        c = await self.read_adapter.pfcount(self.key)
         return c
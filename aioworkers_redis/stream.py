@@ -1,8 +1,72 @@
+import asyncio
+import itertools
 import socket
+import sys
+import time
+from collections import deque
+from collections.abc import Mapping
+from typing import Any, Callable, Deque, Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple, Union
 from uuid import uuid4
 
 from aioworkers_redis.base import BaseQueue
 
+_field_names: Dict[Any, str] = {}
+
+
+def field_name(raw: Any) -> str:
+    name = _field_names.get(raw)
+    if name is None:
+        name = sys.intern(raw.decode() if isinstance(raw, bytes) else raw)
+        if len(_field_names) < 10000:
+            _field_names[raw] = name
+    return name
+
+
+class Entry(Mapping):
+    __slots__ = ("stream", "id", "_fields", "_values", "_decode", "_format_fields")
+
+    def __init__(
+        self,
+        stream: str,
+        id: str,
+        fields: list,
+        decode: Callable[[Any], Any],
+        format_fields: FrozenSet[str] = frozenset(),
+    ):
+        self.stream = stream
+        self.id = id
+        self._fields = fields
+        self._values: Optional[Dict[str, Any]] = None
+        self._decode = decode
+        self._format_fields = format_fields
+
+    def raw(self, name: str) -> Any:
+        for i in range(0, len(self._fields), 2):
+            if field_name(self._fields[i]) == name:
+                return self._fields[i + 1]
+        raise KeyError(name)
+
+    def __getitem__(self, name: str) -> Any:
+        if self._values is None:
+            self._values = {}
+        elif name in self._values:
+            return self._values[name]
+        value = self.raw(name)
+        if not self._format_fields or name in self._format_fields:
+            value = self._decode(value)
+        self._values[name] = value
+        return value
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(0, len(self._fields), 2):
+            yield field_name(self._fields[i])
+
+    def __len__(self) -> int:
+        return len(self._fields) // 2
+
+    def __repr__(self) -> str:
+        return f"<Entry {self.stream} {self.id}>"
+
 
 class XQueue(BaseQueue):
     def set_config(self, config):
@@ -10,22 +74,87 @@ class XQueue(BaseQueue):
         hostname = socket.gethostname()
         self._format_fields = frozenset(self.config.get("format_fields") or ())
         self._maxlen = self.config.get("maxlen")
+        self._retention: Optional[float] = self.config.get_duration("retention", default=None, null=True)
+        if self._maxlen and self._retention:
+            raise ValueError("XADD trims by maxlen or retention, not both")
+        self._limit: Optional[int] = self.config.get("limit")
+        self._approx: bool = self.config.get_bool("approx", default=True)
+        self._raw: bool = self.config.get_bool("raw", default=False)
         self._group_name = self.config.get("group_name") or hostname
         self._group_create = self.config.get_bool("group_create", default=True)
         self._consumer_name = self.config.get("consumer_name") or f"{hostname}-{uuid4()}"
+        self._batch_size: int = self.config.get_int("batch_size", default=1)
+        self._streams: List[str] = list(self.config.get("streams") or ())
+        self._rotation = 0
+        self._buffer: Deque[Tuple[str, str, list]] = deque()
+        self._auto_ack: bool = self.config.get_bool("auto_ack", default=False)
+        self._ack_batch: int = self.config.get_int("ack_batch", default=100)
+        self._ack_interval: float = self.config.get_duration("ack_interval", default=0.1)
+        self._acks: Dict[str, List[str]] = {}
+        self._delivered: Dict[str, Set[str]] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._claim_interval: Optional[float] = self.config.get_duration("claim_interval", default=None, null=True)
+        self._claim_min_idle: float = self.config.get_duration("claim_min_idle", default=60)
+        if self._batch_size > 1 and not self._claim_interval:
+            # entries left in the buffer on disconnect only come back by claim
+            self.logger.warning(
+                "batch_size %s needs claim_interval, set to %ss", self._batch_size, self._claim_min_idle
+            )
+            self._claim_interval = self._claim_min_idle
+        self._claim_count: int = self.config.get_int("claim_count", default=100)
+        self._claim_cursor: Dict[str, str] = {}
 
     def factory(self, item, config=None):
         inst = super().factory(item, config=config)
         inst._format_fields = self._format_fields
         inst._maxlen = self._maxlen
+        inst._retention = self._retention
+        inst._limit = self._limit
+        inst._approx = self._approx
+        inst._raw = self._raw
         inst._group_name = self._group_name
         inst._consumer_name = self._consumer_name
+        inst._batch_size = self._batch_size
+        inst._streams = []
+        inst._buffer = deque()
+        inst._auto_ack = self._auto_ack
+        inst._ack_batch = self._ack_batch
+        inst._ack_interval = self._ack_interval
+        inst._acks = {}
+        inst._delivered = {}
+        inst._claim_interval = self._claim_interval
+        inst._claim_min_idle = self._claim_min_idle
+        inst._claim_count = self._claim_count
+        inst._claim_cursor = {}
         return inst
 
+    @property
+    def streams(self) -> List[str]:
+        if not hasattr(self, "_stream_keys"):
+            self._stream_keys = [self.raw_key(s) for s in self._streams] or [self.key]
+        return self._stream_keys
+
     async def connect(self):
         await super().connect()
         if self._group_create:
-            await self.create_group(stream=self.key, group_name=self._group_name)
+            for stream in self.streams:
+                await self.create_group(stream=stream, group_name=self._group_name)
+        if self._ack_interval:
+            self._tasks.append(asyncio.create_task(self._flush_loop()))
+        if self._claim_interval:
+            self._tasks.append(asyncio.create_task(self._claim_loop()))
+
+    async def disconnect(self):
+        # redis-py may turn a cancel into an error, the loops stop on it without tasks
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._buffer:
+            self.logger.info("%s buffered entries are left pending to be claimed", len(self._buffer))
+            self._buffer.clear()
+        await self.flush()
+        await super().disconnect()
 
     async def create_group(self, stream: str, group_name: str):
         try:
@@ -41,28 +170,174 @@ class XQueue(BaseQueue):
         except Exception as ex:
             self.logger.debug("XGroup create error: %r", ex)
 
-    async def get(self, timeout: float = 0):
+    def _parse_entries(self, stream: str, entries) -> List[Tuple[str, str, list]]:
+        result = []
+        for msg_id, fields in entries:
+            if isinstance(msg_id, bytes):
+                msg_id = msg_id.decode()
+            if fields is None:
+                # entry was deleted from the stream while pending
+                self._acks.setdefault(stream, []).append(msg_id)
+                continue
+            result.append((stream, msg_id, fields))
+        return result
+
+    async def _read(self, count: int, timeout: float):
+        streams = self.streams
+        i = self._rotation % len(streams)
+        self._rotation += 1
+        streams = streams[i:] + streams[:i]
+        data = await self.adapter.execute(
+            "XREADGROUP",
+            "GROUP",
+            self._group_name,
+            self._consumer_name,
+            "COUNT",
+            count,
+            "BLOCK",
+            int(timeout * 1000),
+            "STREAMS",
+            *streams,
+            *(">" for _ in streams),
+        )
+        batches = []
+        for stream, entries in data or ():
+            if isinstance(stream, bytes):
+                stream = stream.decode()
+            batches.append(self._parse_entries(stream, entries))
+        # interleave streams so that a hot stream does not starve others
+        for row in itertools.zip_longest(*batches):
+            self._buffer.extend(entry for entry in row if entry is not None)
+
+    async def claim(self) -> int:
+        n = 0
+        for stream in self.streams:
+            n += await self._claim(stream)
+        return n
+
+    async def _claim(self, stream: str) -> int:
+        reply = await self.adapter.execute(
+            "XAUTOCLAIM",
+            stream,
+            self._group_name,
+            self._consumer_name,
+            int(self._claim_min_idle * 1000),
+            self._claim_cursor.get(stream, "0-0"),
+            "COUNT",
+            self._claim_count,
+        )
+        cursor, entries = reply[0], reply[1]
+        self._claim_cursor[stream] = cursor.decode() if isinstance(cursor, bytes) else cursor
+        # XAUTOCLAIM also returns own entries that are still buffered or not acked yet
+        own = self._delivered.get(stream, set()).union(i for s, i, _ in self._buffer if s == stream)
+        claimed = [e for e in self._parse_entries(stream, entries) if e[1] not in own]
+        self._buffer.extend(claimed)
+        if claimed:
+            self.logger.warning("Claimed %s pending entries of stream %r", len(claimed), stream)
+        await self._delete_consumers(stream)
+        return len(claimed)
+
+    async def _delete_consumers(self, stream: str):
+        consumers = await self.adapter.execute("XINFO", "CONSUMERS", stream, self._group_name)
+        for consumer in consumers:
+            info = dict(zip(consumer[::2], consumer[1::2]))
+            name = info[b"name"].decode()
+            if name == self._consumer_name or info[b"pending"]:
+                continue
+            elif info[b"idle"] >= self._claim_min_idle * 1000:
+                await self.adapter.execute("XGROUP", "DELCONSUMER", stream, self._group_name, name)
+                self.logger.info("Deleted idle consumer %r of stream %r", name, stream)
+
+    async def _claim_loop(self):
+        assert self._claim_interval
+        while self._tasks:
+            await asyncio.sleep(self._claim_interval)
+            try:
+                await self.claim()
+            except Exception:
+                if self._tasks:
+                    self.logger.exception("Claim error")
+
+    def _decode_item(self, fields: list) -> Dict[str, Any]:
+        result = {}
+        for i in range(0, len(fields), 2):
+            k = field_name(fields[i])
+            if not self._format_fields or k in self._format_fields:
+                result[k] = self.decode(fields[i + 1])
+            else:
+                result[k] = fields[i + 1]
+        return result
+
+    async def get_many(
+        self,
+        n: int,
+        *,
+        timeout: float = 0,
+        with_id: bool = False,
+        with_stream: bool = False,
+    ) -> List[Any]:
         async with self._lock:
-            data = await self.adapter.xread(
-                self.key,
-                id=">",
-                count=1,
-                noack=False,
-                block=int(timeout * 1000),
-                group=self._group_name,
-            )
-        for _stream, items in data.items():
-            for _msg_id, item in items.items():
-                result = {}
-                for k, v in item.items():
-                    if not self._format_fields or k in self._format_fields:
-                        result[k] = self.decode(v)
-                    else:
-                        result[k] = v
-                return result
-        raise TimeoutError
-
-    async def put(self, value):
+            if not self._buffer:
+                await self._read(max(n, self._batch_size), timeout)
+            result: List[Any] = []
+            while self._buffer and len(result) < n:
+                stream, msg_id, fields = self._buffer.popleft()
+                self._delivered.setdefault(stream, set()).add(msg_id)
+                if self._auto_ack:
+                    self._acks.setdefault(stream, []).append(msg_id)
+                value: Any
+                if self._raw:
+                    value = Entry(stream, msg_id, fields, self.decode, self._format_fields)
+                else:
+                    value = self._decode_item(fields)
+                if with_id:
+                    value = msg_id, value
+                if with_stream:
+                    value = (stream, *value) if with_id else (stream, value)
+                result.append(value)
+        if not result:
+            raise TimeoutError
+        await self._flush_if_full()
+        return result
+
+    async def get(self, timeout: float = 0, *, with_id: bool = False, with_stream: bool = False):
+        result = await self.get_many(1, timeout=timeout, with_id=with_id, with_stream=with_stream)
+        return result[0]
+
+    async def ack(self, msg: Union[str, Entry], *, stream: Optional[str] = None):
+        if isinstance(msg, Entry):
+            stream, msg = msg.stream, msg.id
+        await self.ack_many([msg], stream=stream)
+
+    async def ack_many(self, msg_ids: Iterable[str], *, stream: Optional[str] = None):
+        if stream is None:
+            if len(self.streams) > 1:
+                raise ValueError("stream is required to ack from %s" % ", ".join(self.streams))
+            stream = self.streams[0]
+        self._acks.setdefault(stream, []).extend(msg_ids)
+        await self._flush_if_full()
+
+    async def _flush_if_full(self):
+        if not self._ack_interval or sum(map(len, self._acks.values())) >= self._ack_batch:
+            await self.flush()
+
+    async def flush(self):
+        acks, self._acks = self._acks, {}
+        for stream, msg_ids in acks.items():
+            if msg_ids:
+                await self.adapter.execute("XACK", stream, self._group_name, *msg_ids)
+                self._delivered.get(stream, set()).difference_update(msg_ids)
+
+    async def _flush_loop(self):
+        while self._tasks:
+            await asyncio.sleep(self._ack_interval)
+            try:
+                await self.flush()
+            except Exception:
+                if self._tasks:
+                    self.logger.exception("Flush acks error")
+
+    def _encode_item(self, value: Dict[str, Any]) -> Dict[str, Any]:
         fields = {}
         for k, v in value.items():
             if v is None:
@@ -71,12 +346,37 @@ class XQueue(BaseQueue):
                 fields[k] = self.encode(v)
             else:
                 fields[k] = v
-        kwargs = {}
+        return fields
+
+    def _trim_kwargs(self) -> Dict[str, Any]:
+        kwargs: Dict[str, Any] = {}
         if self._maxlen:
             kwargs["maxlen"] = self._maxlen
-            kwargs["approx"] = True
+        if self._retention:
+            kwargs["minid"] = int((time.time() - self._retention) * 1000)
+        if kwargs:
+            kwargs["approx"] = self._approx
+            kwargs["limit"] = self._limit
+        return kwargs
+
+    async def put(self, value, *, stream: Optional[str] = None):
         await self.adapter.xadd(
-            self.key,
-            fields,
-            **kwargs,
+            stream or self.key,
+            self._encode_item(value),
+            **self._trim_kwargs(),
         )
+
+    async def put_many(self, values: Iterable[Dict[str, Any]], *, stream: Optional[str] = None) -> List[str]:
+        values = list(values)
+        kwargs = self._trim_kwargs()
+        result: List[str] = []
+        for i in range(0, len(values), self._chunk_size):
+            async with self.pipeline() as p:
+                futures = [
+                    p.xadd(stream or self.key, self._encode_item(value), **kwargs)
+                    for value in values[i : i + self._chunk_size]
+                ]
+            for fut in futures:
+                msg_id = await fut
+                result.append(msg_id.decode() if isinstance(msg_id, bytes) else msg_id)
+        return result
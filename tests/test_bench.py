@@ -0,0 +1,28 @@
+import json
+
+from aioworkers_redis.bench import SCENARIOS, run, run_scenario
+from aioworkers_redis.bench.__main__ import main
+
+
+async def test_run_scenario():
+    for name in SCENARIOS:
+        result = await run_scenario(name, requests=10, concurrency=2)
+        assert result["scenario"] == name
+        assert not result["errors"]
+        assert result["ops_per_sec"] > 0
+        assert result["p50_ms"] <= result["p99_ms"]
+
+
+async def test_run():
+    results = await run(adapters=["unknown"], scenarios=["queue.put"], sizes=[1], concurrency=[1], timeout=0.5)
+    assert "error" in results[0]
+
+
+def test_main(tmp_path):
+    output = tmp_path / "bench.json"
+    main(
+        ["--scenarios", "storage.get", "--sizes", "8", "--concurrency", "2", "--requests", "5", "-q", "-o", str(output)]
+    )
+    report = json.loads(output.read_text())
+    assert report["adapters"]
+    assert len(report["results"]) == len(report["adapters"])
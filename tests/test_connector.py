@@ -1,8 +1,12 @@
+import asyncio
+import uuid
 from unittest import mock
 
 import pytest
+from aioworkers.core.context import Context
 from aioworkers.utils import import_name
 
+from aioworkers_redis.adapter import AutoPipeline
 from aioworkers_redis.base import Connector
 
 
@@ -100,3 +104,126 @@ async def test_bad_link(config):
     with pytest.raises(ValueError):
         async with cls(config.connector) as c:
             assert c.connector
+
+
+async def test_eval_script(config):
+    config.update(
+        {
+            "connector.dsn": "redis://localhost",
+            "connector.name": "connector",
+        }
+    )
+    async with Connector(config.connector) as c:
+        script = "return ARGV[1]"
+        assert b"1" == await c.eval_script(script, 0, 1)
+        await c.adapter.execute("SCRIPT", "FLUSH")
+        assert b"2" == await c.eval_script(script, 0, 2)
+
+
+async def test_autopipeline(config):
+    config.update(
+        {
+            "connector.dsn": "redis://localhost",
+            "connector.name": "connector",
+            "connector.autopipeline": True,
+        }
+    )
+    async with Connector(config.connector) as c:
+        assert isinstance(c.adapter, AutoPipeline) == hasattr(c.adapter, "execute_many")
+        keys = [c.raw_key(str(i)) for i in range(50)]
+        await asyncio.gather(*(c.adapter.set(k, i) for i, k in enumerate(keys)))
+        values = await asyncio.gather(*(c.adapter.get(k) for k in keys))
+        assert [str(i).encode() for i in range(50)] == values
+        results = await asyncio.gather(
+            c.adapter.execute("INCR", keys[0]),
+            c.adapter.execute("HGET", keys[1], "f"),
+            return_exceptions=True,
+        )
+        assert 1 == results[0]
+        assert isinstance(results[1], Exception)
+        # replies are the same as without autopipeline
+        assert True is await c.adapter.set(keys[0], 1)
+        assert True is await c.adapter.expire(keys[0], 10)
+        assert isinstance(await c.adapter.xadd(keys[0] + ":s", {"a": b"1"}), str)
+        await c.adapter.execute("DEL", keys[0] + ":s", *keys)
+
+
+@pytest.mark.parametrize("transaction", [False, True])
+async def test_pipeline(config, transaction):
+    config.update(
+        {
+            "connector.dsn": "redis://localhost",
+            "connector.name": "connector",
+            "connector.format": "json",
+        }
+    )
+    async with Connector(config.connector) as c:
+        key = c.raw_key(str(uuid.uuid4()))
+        async with c.pipeline(transaction=transaction) as p:
+            ok = p.set(key, p.encode({"a": 1}))
+            get = p.get(key)
+            missing = p.get(key + ":missing")
+            p.hset(key + ":h", mapping={"f": 1})
+            hgetall = p.hgetall(key + ":h")
+        assert b"OK" == await ok
+        assert {"a": 1} == p.decode(await get)
+        assert await missing is None
+        assert {b"f": b"1"} == await hgetall
+        with pytest.raises(Exception, match="integer"):
+            async with c.pipeline(transaction=transaction) as p:
+                p.execute("INCR", key)
+                delete = p.execute("DEL", key, key + ":h")
+        assert 2 == await delete
+
+
+exported = []
+
+
+def export(metrics):
+    exported.append(metrics.snapshot())
+
+
+async def test_metrics(config):
+    config.update(
+        {
+            "connector.metrics.export": "tests.test_connector.export",
+            "connector.metrics.interval": 0.05,
+        }
+    )
+    async with Context(config) as ctx:
+        c = ctx.connector
+        child = c.child
+        key = child.raw_key(str(uuid.uuid4()))
+        assert await c._adapter.set(key, b"1") == await child.adapter.set(key, b"1")
+        assert b"1" == await child.adapter.get(key)
+        await child.adapter.rpush(key + ":l", b"2")
+        assert await child.adapter.blpop(key + ":l", timeout=1)
+        with pytest.raises(Exception, match="WRONGTYPE"):
+            await child.adapter.execute("HGET", key, "f")
+        async with child.pipeline() as p:
+            p.execute("DEL", key)
+        stats = {(i["entity"], i["command"]): i for i in c.metrics.snapshot()}
+        assert 1 == stats["connector.child", "GET"]["received_bytes"]
+        assert 1 == stats["connector.child", "HGET"]["errors"]
+        # without pipelines the batch is sent as one script
+        batch = "DEL" if hasattr(child.adapter, "execute_many") else "EVALSHA"
+        assert 1 == stats["connector.child", batch]["count"]
+        assert 1 == stats["connector.child", "BLPOP"]["count"]
+        assert 'entity="connector.child",command="SET"' in c.metrics.prometheus()
+        await asyncio.sleep(0.1)
+    assert exported
+
+
+async def test_gather_slots():
+    c = Connector(name="x", brackets=True)
+    c._connector = c
+    c._cluster = True
+    raw_keys = [c.raw_key("a"), c.raw_key("b"), "{a}:c"]
+    groups = []
+
+    async def call(group):
+        groups.append(group)
+        return [raw_keys[i] for i in group]
+
+    assert raw_keys == await c._gather_slots(raw_keys, call)
+    assert [[0, 2], [1]] == groups
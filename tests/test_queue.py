@@ -1,3 +1,4 @@
+import asyncio
 import time
 import uuid
 from unittest import mock
@@ -5,7 +6,7 @@ from unittest import mock
 import pytest
 from aioworkers.core.context import Context
 
-from aioworkers_redis.queue import Queue
+from aioworkers_redis.queue import Queue, ReliableQueue
 
 
 @pytest.fixture
@@ -37,6 +38,122 @@ async def test_queue(config, blocking):
             await q.get(timeout=1)
 
 
+@pytest.mark.parametrize("blocking", [True, False])
+async def test_queue_many(config, blocking):
+    config.update(
+        q=dict(
+            cls="aioworkers_redis.queue.Queue",
+            format="json",
+            blocking=blocking,
+            chunk_size=2,
+        )
+    )
+    async with Context(config) as ctx:
+        q: Queue = ctx.q
+        await q.put_many([1, 2, 3, 4, 5])
+        assert 5 == await q.length()
+        assert [1, 2] == await q.get_many(2)
+        assert [3, 4, 5] == await q.get_many(10)
+        assert not await q.length()
+        with pytest.raises(TimeoutError):
+            await q.get_many(2, timeout=1)
+
+
+async def test_queue_consumers(config):
+    config.update(q=dict(cls="aioworkers_redis.queue.Queue", consumers=2))
+    async with Context(config) as ctx:
+        q: Queue = ctx.q
+        started = time.monotonic()
+        results = await asyncio.gather(
+            q.get(timeout=1),
+            q.get(timeout=1),
+            return_exceptions=True,
+        )
+        assert time.monotonic() - started < 1.9
+        assert all(isinstance(r, TimeoutError) for r in results)
+
+
+async def test_queue_prefetch(config):
+    config.update(q=dict(cls="aioworkers_redis.queue.Queue", format="json", prefetch=3))
+    async with Context(config) as ctx:
+        q: Queue = ctx.q
+        await q.put_many([1, 2, 3, 4, 5])
+        assert 1 == await q.get()
+        assert [2, 3] == await q.get_many(2)
+    config.update(q=dict(prefetch=0))
+    async with Context(config) as ctx:
+        assert [4, 5] == await ctx.q.list()
+        await ctx.q.clear()
+
+
+async def test_queue_prefetch_disconnect(config):
+    config.update(q=dict(cls="aioworkers_redis.queue.Queue", prefetch=10, timeout=5))
+    async with Context(config):
+        await asyncio.sleep(0.1)
+        started = time.monotonic()
+    assert time.monotonic() - started < 1.5
+
+
+async def test_reliable_queue(config):
+    config.update(q=dict(cls="aioworkers_redis.queue.ReliableQueue", format="json"))
+    async with Context(config) as ctx:
+        q: ReliableQueue = ctx.q
+        await q.put_many([1, 2, 3])
+        assert 1 == await q.get()
+        assert [b"1"] == await q.adapter.lrange(q.processing_key, 0, -1)
+        await q.ack(1)
+        await q.flush()
+        assert [] == await q.adapter.lrange(q.processing_key, 0, -1)
+        assert 2 == await q.get()
+        await q.nack(2)
+        await q.flush()
+        assert [3, 2] == await q.list()
+        assert 3 == await q.get()
+
+        # values from other producers may not encode back to the same bytes
+        await q.adapter.execute("RPUSH", q.key, b'{"a":1}', b'{"b":2}')
+        two, a, b = await q.get_many(3)
+        await q.ack(a)
+        await q.nack(b)
+        await q.nack(two)
+        await q.flush()
+        assert [b"3"] == await q.adapter.lrange(q.processing_key, 0, -1)
+        assert [{"b": 2}, 2] == await q.list()
+        b = await q.get()
+        assert {"b": 2} == b
+        await q.ack(b)
+        await q.flush()
+
+        dead = q._subkey("processing", "dead")
+        await q.adapter.execute("RPUSH", dead, b"4", b"5")
+        await q.adapter.execute("SADD", q._subkey("consumers"), "dead")
+        await q.reap()
+        assert [4, 5, 2] == await q.list()
+    config.update(q=dict(cls="aioworkers_redis.queue.Queue"))
+    async with Context(config) as ctx:
+        assert [3, 4, 5, 2] == await ctx.q.list()
+        await ctx.q.clear()
+
+
+async def test_reliable_queue_disconnect(config):
+    config.update(q=dict(cls="aioworkers_redis.queue.Queue", format="json"))
+    async with Context(config) as producer:
+        config.update(q=dict(cls="aioworkers_redis.queue.ReliableQueue", prefetch=5, consumer_name="c1"))
+        async with Context(config):
+            # the prefetcher is waiting in BLMOVE when disconnect starts
+            await asyncio.sleep(0.1)
+
+            async def put():
+                await asyncio.sleep(0.1)
+                await producer.q.put(1)
+
+            task = asyncio.create_task(put())
+        await task
+        assert [1] == await producer.q.list()
+        assert [] == await producer.q.adapter.lrange(producer.q._subkey("processing", "c1"), 0, -1)
+        await producer.q.clear()
+
+
 async def test_nested_queue(config):
     config.update(q=dict(cls="aioworkers_redis.queue.Queue", format="json"))
     async with Context(config) as ctx:
@@ -66,6 +183,7 @@ async def test_zqueue(config):
         q=dict(
             cls="aioworkers_redis.queue.ZQueue",
             format="json",
+            blocking=False,
             timeout=0,
         )
     )
@@ -96,11 +214,39 @@ async def test_zqueue(config):
                 await q.get()
 
 
+async def test_zqueue_blocking(config):
+    config.update(
+        q=dict(
+            cls="aioworkers_redis.queue.ZQueue",
+            format="json",
+            timeout=1,
+        )
+    )
+    async with Context(config) as ctx:
+        q = ctx.q
+        await q.put("c", 3)
+        await q.put("b", 2)
+        await q.put("a", 1)
+        assert "a" == await q.get()
+        assert [(2, "b"), (3, "c")] == await q.get_many(5)
+
+        async def put():
+            await asyncio.sleep(0.1)
+            await q.put("d", 4)
+
+        task = asyncio.create_task(put())
+        assert "d" == await q.get()
+        await task
+        with pytest.raises(TimeoutError):
+            await q.get_many(1, timeout=0.5)
+
+
 async def test_ts_zqueue(config):
     config.update(
         q=dict(
             cls="aioworkers_redis.queue.TimestampZQueue",
             format="json",
+            blocking=False,
             timeout=10,
         )
     )
@@ -120,3 +266,66 @@ async def test_ts_zqueue(config):
         with mock.patch("asyncio.sleep", breaker):
             with pytest.raises(InterruptedError):
                 await q.get()
+
+
+async def test_ts_zqueue_wakeup(config):
+    config.update(
+        q=dict(
+            cls="aioworkers_redis.queue.TimestampZQueue",
+            format="json",
+        )
+    )
+    async with Context(config) as ctx:
+        q = ctx.q
+        await q.put("b", time.time() + 0.2)
+        started = time.time()
+        assert "b" == await q.get()
+        assert 0.2 <= time.time() - started < 0.5
+
+        async def put():
+            await asyncio.sleep(0.1)
+            await q.put("a", time.time())
+
+        await q.put("c", time.time() + 60)
+        task = asyncio.create_task(put())
+        started = time.time()
+        assert "a" == await q.get()
+        assert time.time() - started < 0.5
+        await task
+        await q.clear()
+
+
+async def test_ts_zqueue_due_within_ms(config):
+    config.update(
+        q=dict(
+            cls="aioworkers_redis.queue.TimestampZQueue",
+            format="json",
+        )
+    )
+    async with Context(config) as ctx:
+        q = ctx.q
+        now = time.time()
+        await q.put("a", now + 0.0005)
+        await q.adapter.delete(q.wakeup_key)
+        clock, real = [now, now], time.time
+        with mock.patch("time.time", lambda: clock.pop() if clock else real()):
+            assert "a" == await q.get()
+        await q.clear()
+
+
+async def test_ts_zqueue_many(config):
+    config.update(
+        q=dict(
+            cls="aioworkers_redis.queue.TimestampZQueue",
+            format="json",
+        )
+    )
+    async with Context(config) as ctx:
+        q = ctx.q
+        for i in range(5):
+            await q.put(i, i + 1)
+        await q.put("later", time.time() + 60)
+        assert [(1, 0), (2, 1), (3, 2)] == await q.get_many(3)
+        assert [(4, 3), (5, 4)] == await q.get_many(10)
+        assert ["later"] == await q.list()
+        await q.clear()
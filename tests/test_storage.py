@@ -1,8 +1,12 @@
+import asyncio
+import socket
 import uuid
+from typing import cast
 
 import pytest
 from aioworkers.core.context import Context
 
+from aioworkers_redis.adapter import Adapter
 from aioworkers_redis.storage import HashStorage, HyperLogLogStorage, Storage
 
 
@@ -15,6 +19,7 @@ def config_yaml():
         format: json
     hyperloglog:
         cls: aioworkers_redis.storage.HyperLogLogStorage
+        prefix: {uuid}
         key: hll
     """.format(uuid=uuid.uuid4())
 
@@ -37,6 +42,41 @@ async def test_storage(context):
     assert not await s.length()
 
 
+async def test_iter_keys(context):
+    s: Storage = context.storage
+    for i in range(5):
+        await s.set(str(i), i)
+    assert ["0", "1", "2", "3", "4"] == sorted([k async for k in s.iter_keys(batch=2)])
+    assert 5 == await s.length()
+    for i in range(5):
+        await s.set(str(i), None)
+
+
+async def test_list_duplicates(context, mocker):
+    async def iter_keys(batch=1000):
+        for k in ["a", "b", "a"]:
+            yield k
+
+    s: Storage = context.storage
+    mocker.patch.object(s, "iter_keys", iter_keys)
+    assert ["a", "b"] == await s.list()
+    assert 2 == await s.length()
+
+
+@pytest.mark.parametrize("expiry", [None, 10])
+async def test_storage_many(config, expiry):
+    config.update(storage=dict(expiry=expiry, chunk_size=2))
+    async with Context(config) as ctx:
+        s: Storage = ctx.storage
+        await s.set_many({"a": 1, "b": {"c": 2}, "d": 3})
+        assert [1, {"c": 2}, None, 3] == await s.get_many(["a", "b", "c", "d"])
+        if expiry:
+            assert 0 < await s.adapter.execute("PTTL", s.raw_key("a")) <= 10000
+        await s.set_many({"a": None, "b": None, "d": None})
+        assert [None, None] == await s.get_many(["a", "b"])
+        assert not await s.length()
+
+
 async def test_nested_storage(context):
     s: Storage = context.storage
     q_child = s.child
@@ -82,6 +122,102 @@ async def test_field_storage(config):
         await storage.set(key, None)
 
 
+async def test_local_cache(config):
+    config.update(storage=dict(local_cache=dict(size=2, ttl="1m")))
+    async with Context(config) as ctx:
+        storage: Storage = ctx.storage
+        cache = storage.cache
+        assert cache is not None
+        while not cache.active:
+            await asyncio.sleep(0.01)
+        await storage.set("a", 1)
+        await asyncio.sleep(0.1)
+        assert 1 == await storage.get("a")
+        assert 1 == await storage.get("a")
+        assert (1, 1) == (cache.hits, cache.misses)
+        await storage.set("a", 2)
+        assert 2 == await storage.get("a")
+        if hasattr(storage.adapter, "tracking"):
+            await storage.adapter.execute("SET", storage.raw_key("a"), b"3")
+            while len(cache):
+                await asyncio.sleep(0.01)
+            assert 3 == await storage.get("a")
+        await storage.get("b")
+        await storage.get("c")
+        assert 2 == len(cache)
+        await storage.set("a", None)
+
+
+@pytest.mark.parametrize("read_selection", ["round_robin", "latency"])
+async def test_read_replica(config, read_selection):
+    config.update(
+        storage=dict(
+            read_from="replica",
+            connection=dict(
+                address="redis://localhost",
+                replicas=["redis://localhost", "redis://localhost"],
+                read_selection=read_selection,
+            ),
+        )
+    )
+    async with Context(config) as ctx:
+        storage: Storage = ctx.storage
+        assert storage.read_adapter is not storage.adapter
+        assert storage.read_adapter is not storage.read_adapter or read_selection == "latency"
+        await storage.set("a", 1)
+        assert 1 == await storage.get("a")
+        assert [1, None] == await storage.get_many(["a", "b"])
+        await storage.set("a", None)
+
+        scanned = []
+
+        class Spy:
+            def __init__(self, adapter):
+                self.adapter = adapter
+
+            def execute(self, *args):
+                if args[0] == "SCAN":
+                    scanned.append(self)
+                return self.adapter.execute(*args)
+
+        connector = storage._get_connector()
+        connector._replicas = [cast(Adapter, Spy(a)) for a in connector._replicas]
+        await storage.set_many({str(i): i for i in range(10)})
+        assert 10 == len([k async for k in storage.iter_keys(batch=2)])
+        assert len(scanned) > 1
+        assert 1 == len(set(scanned))
+        await storage.set_many({str(i): None for i in range(10)})
+
+
+async def test_local_cache_without_ttl(config):
+    config.update(storage=dict(local_cache=dict(size=2)))
+    async with Context(config) as ctx:
+        storage: Storage = ctx.storage
+        if hasattr(storage.adapter, "tracking"):
+            assert storage.cache is not None
+        else:
+            assert storage.cache is None
+
+
+async def test_field_storage_many(config):
+    config.update(
+        storage=dict(
+            cls="aioworkers_redis.storage.HashStorage",
+            expiry=10,
+            chunk_size=2,
+        )
+    )
+    async with Context(config) as ctx:
+        storage: HashStorage = ctx.storage
+        await storage.set("a", {"f": 1, "g": 2})
+        await storage.set("b", {"f": 3})
+        assert 0 < await storage.adapter.execute("PTTL", storage.raw_key("b")) <= 10000
+        await storage.set("b", {"f": None, "g": 4})
+        assert [{"f": 1, "g": 2}, {"g": 4}, {}] == await storage.get_many(["a", "b", "c"])
+        assert [{"f": 1}, {"f": None}] == await storage.get_many(["a", "b"], fields=["f"])
+        await storage.set_many({"a": None, "b": None})
+
+
 async def test_hyperloglog(context):
     hll: HyperLogLogStorage = context.hyperloglog
     await hll.set("a", True)
@@ -90,3 +226,49 @@ async def test_hyperloglog(context):
     assert False is await hll.get("b")
     assert True is await hll.get("a")
     assert 1 == await hll.length()
+    await hll.set_many(["c", "d"])
+    raw = await hll.adapter.execute("GET", hll.key)
+    assert [True, False, True, True] == await hll.get_many(["a", "b", "c", "d"])
+    # members of one call are checked with the earlier ones added
+    assert [False, True] == await hll.get_many(["e", "e"])
+    assert raw == await hll.adapter.execute("GET", hll.key)
+    assert 3 == await hll.length()
+    await hll.adapter.delete(hll.key)
+
+
+def cluster_available() -> bool:
+    try:
+        socket.create_connection(("localhost", 7000), timeout=0.1).close()
+    except OSError:
+        return False
+    return True
+
+
+@pytest.mark.skipif(not cluster_available(), reason="Redis Cluster is not running on localhost:7000")
+async def test_cluster(config):
+    prefix = str(uuid.uuid4())
+    config.update(
+        redis=dict(
+            cls="aioworkers_redis.base.Connector",
+            connection=dict(address=["redis://localhost:7000"], cluster=True),
+        ),
+        storage=dict(connection=".redis", expiry=10),
+        zqueue=dict(cls="aioworkers_redis.queue.ZQueue", connection=".redis", key="{%s}:z" % prefix, format="json"),
+    )
+    async with Context(config) as ctx:
+        if type(ctx.redis._adapter_holder).__name__ == "AdapterAioRedis":
+            pytest.skip("aioredis does not support cluster")
+        storage: Storage = ctx.storage
+        assert 3 == len(storage.nodes)
+        for node in storage.nodes:
+            await node.execute("SCRIPT", "FLUSH")
+        await storage.set_many({str(i): i for i in range(20)})
+        assert 20 == len(await storage.list())
+        assert 20 == await storage.length()
+        await ctx.zqueue.put("a")
+        assert "a" == await ctx.zqueue.get()
+        if not hasattr(storage.adapter, "execute_many"):
+            with pytest.raises(ValueError):
+                async with storage.pipeline(transaction=True) as p:
+                    p.execute("GET", storage.raw_key("0"))
+        await storage.set_many({str(i): None for i in range(20)})
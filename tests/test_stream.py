@@ -1,8 +1,10 @@
+import asyncio
 import uuid
 
 import pytest
+from aioworkers.core.context import Context
 
-from aioworkers_redis.stream import XQueue
+from aioworkers_redis.stream import Entry, XQueue
 
 
 @pytest.fixture
@@ -33,3 +35,136 @@ async def test_queue(context):
 
     with pytest.raises(TimeoutError):
         await q.get(timeout=1)
+
+
+async def test_queue_batch(config):
+    config.update(q=dict(batch_size=3))
+    async with Context(config) as ctx:
+        q: XQueue = ctx.q
+        for i in range(5):
+            await q.put({"a": i})
+        assert {"a": 0} == await q.get()
+        assert 2 == len(q._buffer)
+        assert [{"a": 1}, {"a": 2}] == await q.get_many(5)
+        assert [{"a": 3}, {"a": 4}] == await q.get_many(5)
+        with pytest.raises(TimeoutError):
+            await q.get_many(2, timeout=0.1)
+
+
+async def test_queue_batch_disconnect(config):
+    config.update(q=dict(batch_size=3))
+    async with Context(config) as ctx:
+        q: XQueue = ctx.q
+        assert q._claim_interval == 60
+        await q.put_many([{"a": i} for i in range(3)])
+        msg_id, value = await q.get(with_id=True)
+        await q.ack(msg_id)
+    config.update(q=dict(claim_min_idle=0))
+    async with Context(config) as ctx:
+        q = ctx.q
+        assert 2 == await q.claim()
+        assert [{"a": 1}, {"a": 2}] == await q.get_many(3)
+
+
+async def test_queue_ack(config):
+    config.update(q=dict(ack_batch=2, ack_interval=60))
+    async with Context(config) as ctx:
+        q: XQueue = ctx.q
+        await q.put({"a": 1})
+        await q.put({"a": 2})
+        msg_id, value = await q.get(with_id=True)
+        assert {"a": 1} == value
+        await q.ack(msg_id)
+        assert 1 == (await q.adapter.execute("XPENDING", q.key, "x"))[0]
+        [(msg_id, value)] = await q.get_many(1, with_id=True)
+        await q.ack(msg_id)
+        assert 0 == (await q.adapter.execute("XPENDING", q.key, "x"))[0]
+
+    config.update(q=dict(auto_ack=True))
+    async with Context(config) as ctx:
+        q = ctx.q
+        await q.put({"a": 3})
+        assert {"a": 3} == await q.get()
+        await q.flush()
+        assert 0 == (await q.adapter.execute("XPENDING", q.key, "x"))[0]
+
+
+async def test_queue_claim(config):
+    config.update(q=dict(claim_min_idle=0, ack_interval=0))
+    async with Context(config) as ctx:
+        q: XQueue = ctx.q
+        await q.put({"a": 1})
+        await q.adapter.execute("XREADGROUP", "GROUP", "x", "dead", "STREAMS", q.key, ">")
+        assert 1 == await q.claim()
+        msg_id, value = await q.get(timeout=0.1, with_id=True)
+        assert {"a": 1} == value
+        await q.ack(msg_id)
+        consumers = await q.adapter.execute("XINFO", "CONSUMERS", q.key, "x")
+        assert [q._consumer_name.encode()] == [c[1] for c in consumers]
+
+
+async def test_queue_claim_own(config):
+    config.update(q=dict(batch_size=5, claim_min_idle=0.05))
+    async with Context(config) as ctx:
+        q: XQueue = ctx.q
+        for i in range(3):
+            await q.put({"a": i})
+        msg_id, value = await q.get(with_id=True)
+        await asyncio.sleep(0.1)
+        assert 0 == await q.claim()
+        assert 2 == len(q._buffer)
+        await q.ack(msg_id)
+        assert [{"a": 1}, {"a": 2}] == await q.get_many(5)
+
+
+async def test_queue_streams(config):
+    config.update(q=dict(streams=[config.q.key + ":0", config.q.key + ":1"], batch_size=4))
+    async with Context(config) as ctx:
+        q: XQueue = ctx.q
+        s0, s1 = q.streams
+        for i in range(3):
+            await q.put({"a": i}, stream=s0)
+        await q.put({"b": 0}, stream=s1)
+        result = await q.get_many(4, with_stream=True)
+        assert [(s0, {"a": 0}), (s1, {"b": 0}), (s0, {"a": 1}), (s0, {"a": 2})] == result
+        await q.put({"b": 1}, stream=s1)
+        stream, msg_id, value = await q.get(timeout=0.1, with_id=True, with_stream=True)
+        assert (s1, {"b": 1}) == (stream, value)
+        with pytest.raises(ValueError):
+            await q.ack(msg_id)
+        await q.ack(msg_id, stream=stream)
+        for s in q.streams:
+            await q.adapter.delete(s)
+
+
+async def test_queue_put_many(config):
+    config.update(q=dict(retention=60, approx=False, chunk_size=2))
+    async with Context(config) as ctx:
+        q: XQueue = ctx.q
+        await q.adapter.xadd(q.key, {"a": b"0"}, id="1-0")
+        msg_ids = await q.put_many([{"a": i} for i in range(1, 6)])
+        assert 5 == len(msg_ids)
+        assert 5 == await q.adapter.execute("XLEN", q.key)
+        assert [{"a": i} for i in range(1, 6)] == await q.get_many(5)
+
+
+async def test_queue_trim_config(config):
+    config.update(q=dict(maxlen=10, retention=60))
+    with pytest.raises(ValueError):
+        async with Context(config):
+            pass
+
+
+async def test_queue_raw(config):
+    config.update(q=dict(raw=True, format_fields=["a"]))
+    async with Context(config) as ctx:
+        q: XQueue = ctx.q
+        await q.put({"a": {"b": 1}, "c": b"x"})
+        entry = await q.get(timeout=0.1)
+        assert isinstance(entry, Entry)
+        assert entry.stream == q.key
+        assert b'{"b": 1}' == entry.raw("a")
+        assert {"b": 1} == entry["a"]
+        assert entry["a"] is entry["a"]
+        assert {"a": {"b": 1}, "c": b"x"} == entry
+        await q.ack(entry)